@@ -0,0 +1,300 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from FluidSimCore import Simulation
+from FluidSimParallel import parallelSimulation
+from FluidSimProfiler import residentMemory
+
+#Benchmark harness for the fluid simulation. It steps the Simulation headlessly, times every phase of a frame (building
+#the density field, updateVectorField, updating the particles and drawing) and the peak memory used, over a sweep of
+#particle counts, scene sizes, smoothing radii and vector radius multipliers. The results are saved as JSON so two
+#runs can be compared with --compare. With --workers the field solver is also run over that many worker processes with
+#FluidSimParallel, and the speedup of every worker count over 1 worker is printed at the end. --tile-sizes only builds
+#and draws the fields on the tiles around the particles, 0 builds the whole fields. --field-dtypes stores the fields as
+#float32 or float16 instead of float64, and the resident memory of the process after every case is printed with it.
+#--sampling picks how the particles sum the fields around them, "window" around every particle or "table" from tables
+#of the sums built for the whole fields, "auto" picks the cheaper one.
+#
+#Examples:
+#   python FluidSimBenchmark.py --output before.json
+#   python FluidSimBenchmark.py --particles 500 5000 50000 --sizes 500 4000 --output after.json
+#   python FluidSimBenchmark.py --particles 50000 --sizes 2000 --workers 1 2 4 8
+#   python FluidSimBenchmark.py --compare before.json after.json
+
+#Default values every sweep starts from, the same ones the program uses. workers 0 runs the Simulation in this process
+baseCase = {"particles": 500, "size": 500, "smoothingR": 20, "vectorRadius": 12, "solver": "field", "cellSize": 1,
+            "backend": "numpy", "workers": 0, "tileSize": 0, "fieldDtype": "float64", "sampling": "auto"}
+
+#Default values each parameter is swept over
+defaultSweep = {
+    "particles": [500, 2000, 10000, 50000],
+    "size": [500, 1000, 2000, 4000],
+    "smoothingR": [10, 20, 40],
+    "vectorRadius": [6, 12, 24],
+    "solver": ["field"],
+    "cellSize": [1],
+    "backend": ["numpy"],
+    "workers": [0],
+    "tileSize": [0],
+    "fieldDtype": ["float64"],
+    "sampling": ["auto"],
+}
+
+phases = ["density", "vectorField", "particles", "drawing"]
+particleR = 4
+
+#Function to get the smallest square scene the starting block of particles fits in, so large particle counts are not
+#placed outside of the walls
+def sceneSizeFor(particles, size):
+    blockWidth = round(particles**0.5)*(2*particleR + 1) + 2*(particleR + 1)
+    return max(size, blockWidth)
+
+#Function to make the list of cases to run. By default each parameter is swept on its own with the others kept at
+#their base value, with grid=True every combination of the values is run
+def makeCases(sweep, grid=False):
+    names = list(defaultSweep)
+    if grid:
+        cases = [dict(zip(names, values)) for values in itertools.product(*(sweep[name] for name in names))]
+    else:
+        cases = []
+        for name in names:
+            for value in sweep[name]:
+                case = dict(baseCase)
+                case[name] = value
+                if case not in cases:
+                    cases.append(case)
+
+    for case in cases:
+        case["size"] = sceneSizeFor(case["particles"], case["size"])
+
+    return cases
+
+#Function to get the name a case is stored under, which is how cases of two runs are matched when comparing them
+def caseName(case):
+    name = "p" + str(case["particles"]) + "_s" + str(case["size"]) + "_r" + str(case["smoothingR"]) + "_v" + str(case["vectorRadius"])
+    if case["solver"] != "field":
+        name += "_" + case["solver"]
+    if case["cellSize"] != 1:
+        name += "_c" + str(case["cellSize"])
+    if case["backend"] != "numpy":
+        name += "_" + case["backend"]
+    if case.get("workers", 0):
+        name += "_w" + str(case["workers"])
+    if case.get("tileSize", 0):
+        name += "_t" + str(case["tileSize"])
+    if case.get("fieldDtype", "float64") != "float64":
+        name += "_f" + case["fieldDtype"][5:]
+    if case.get("sampling", "auto") != "auto":
+        name += "_" + case["sampling"]
+
+    return name
+
+#Function to make the simulation of a case. Cases with workers only run the field solver with a cell per pixel, numpy
+#and float64 fields
+def makeSimulation(case, seed):
+    np.random.seed(seed)
+    if case.get("workers", 0):
+        sim = parallelSimulation(case["size"], case["size"], case["particles"], particleR, smoothingR=case["smoothingR"],
+                                 vectorRadiusMultiplier=case["vectorRadius"], workers=case["workers"], seed=seed)
+        sim.useRandom = True
+        return sim
+
+    sim = Simulation(case["size"], case["size"], case["particles"], particleR, smoothingR=case["smoothingR"],
+                     vectorRadiusMultiplier=case["vectorRadius"], solver=case["solver"], cellSize=case["cellSize"],
+                     backend=case["backend"], tileSize=case.get("tileSize", 0), fieldDtype=case.get("fieldDtype", "float64"),
+                     sampling=case.get("sampling", "auto"))
+    sim.useRandom = True
+
+    return sim
+
+#Function to make the offscreen window the drawing is timed on, or None when pygame is not installed
+def makeBackground(case):
+    try:
+        from FluidSim_SabaterAlvoGomez import offscreenWindow
+    except ImportError:
+        return None
+
+    return offscreenWindow(case["size"], case["size"])
+
+#Function to draw everything the program can draw in a frame
+def drawFrame(sim, background):
+    background.clear()
+    if sim.solver == "field":
+        sim.dField.drawDensityField(background)
+        sim.vField.drawVectorField(background)
+    sim.particles.draw(background)
+
+#Function to step the simulation once while timing every phase of the step, adding the times to the totals
+def timedStep(sim, background, totals):
+    start = time.perf_counter()
+    sim.updateDensity()
+    afterDensity = time.perf_counter()
+    sim.updateVectors()
+    afterVectors = time.perf_counter()
+    sim.updateParticles()
+    sim.stepCount += 1
+    afterParticles = time.perf_counter()
+
+    totals["density"] += afterDensity - start
+    totals["vectorField"] += afterVectors - afterDensity
+    totals["particles"] += afterParticles - afterVectors
+
+    if background is not None:
+        drawFrame(sim, background)
+        totals["drawing"] += time.perf_counter() - afterParticles
+
+#Function to run one case, returning the mean time of every phase in ms, the steps per second of the simulation
+#without drawing, the peak memory in MB and the resident memory of the process at the end of the timed steps in MB. The
+#peak memory is measured in a separate short run since tracemalloc slows down the timed steps, and for cases with
+#workers both only count the memory of this process
+def runCase(case, steps, warmup, draw=True, seed=0):
+    sim = makeSimulation(case, seed)
+    background = makeBackground(case) if draw else None
+
+    totals = dict.fromkeys(phases, 0.0)
+    for i in range(warmup):
+        timedStep(sim, background, dict.fromkeys(phases, 0.0))
+    for i in range(steps):
+        timedStep(sim, background, totals)
+    residentBytes = residentMemory()
+    closeSimulation(sim)
+
+    tracemalloc.start()
+    memorySim = makeSimulation(case, seed)
+    for i in range(2):
+        timedStep(memorySim, background, dict.fromkeys(phases, 0.0))
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    closeSimulation(memorySim)
+
+    simTime = totals["density"] + totals["vectorField"] + totals["particles"]
+    result = dict(case)
+    result["name"] = caseName(case)
+    result["steps"] = steps
+    result["phaseMs"] = {phase: 1000*totals[phase]/steps for phase in phases if phase != "drawing" or background is not None}
+    result["stepsPerSecond"] = steps/simTime if simTime > 0 else math.inf
+    result["peakMemoryMB"] = peakMemory / 2**20
+    result["residentMB"] = residentBytes / 2**20
+
+    return result
+
+#Function to stop the worker processes of a parallel simulation
+def closeSimulation(sim):
+    if isinstance(sim, parallelSimulation):
+        sim.close()
+
+#Function to get information about the machine and versions a run was made on
+def machineInfo():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpuCount": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+#Function to print the results of a case as one line
+def printResult(result):
+    phaseText = "  ".join(phase + " " + str(round(ms, 2)) + "ms" for phase, ms in result["phaseMs"].items())
+    print(result["name"].ljust(28) + str(round(result["stepsPerSecond"], 1)).rjust(9) + " steps/s  " + phaseText +
+          "  peak " + str(round(result["peakMemoryMB"], 1)) + "MB  resident " + str(round(result["residentMB"], 1)) + "MB")
+
+#Function to run every case and return all the results
+def runBenchmarks(cases, steps, warmup, draw=True, seed=0):
+    results = []
+    for case in cases:
+        result = runCase(case, steps, warmup, draw, seed)
+        printResult(result)
+        results.append(result)
+
+    printScaling(results)
+
+    return {"machine": machineInfo(), "steps": steps, "warmup": warmup, "results": results}
+
+#Function to print how many times faster every case with workers ran than the same case with 1 worker
+def printScaling(results):
+    oneWorker = {}
+    for result in results:
+        if result["workers"] == 1:
+            oneWorker[caseName(dict(result, workers=0))] = result
+
+    for result in results:
+        base = oneWorker.get(caseName(dict(result, workers=0)))
+        if result["workers"] > 1 and base is not None:
+            speedup = result["stepsPerSecond"] / base["stepsPerSecond"]
+            print(result["name"].ljust(28) + str(round(speedup, 2)).rjust(9) + "x over 1 worker  (" +
+                  str(round(speedup / result["workers"] * 100)) + "% efficiency)")
+
+#Function to compare two saved runs case by case, printing how many times faster the new run is in each phase
+def compareRuns(oldPath, newPath):
+    with open(oldPath) as file:
+        old = {result["name"]: result for result in json.load(file)["results"]}
+    with open(newPath) as file:
+        new = {result["name"]: result for result in json.load(file)["results"]}
+
+    comparison = {}
+    for name in old:
+        if name not in new:
+            continue
+        speedups = {"stepsPerSecond": new[name]["stepsPerSecond"] / old[name]["stepsPerSecond"]}
+        for phase, ms in new[name]["phaseMs"].items():
+            if phase in old[name]["phaseMs"] and ms > 0:
+                speedups[phase] = old[name]["phaseMs"][phase] / ms
+        speedups["peakMemory"] = new[name]["peakMemoryMB"] / old[name]["peakMemoryMB"]
+        comparison[name] = speedups
+
+        print(name.ljust(28) + "  ".join(key + " " + str(round(value, 2)) + "x" for key, value in speedups.items()))
+
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fluid simulation over particle counts, scene sizes and radii")
+    parser.add_argument("--particles", type=int, nargs="+", default=defaultSweep["particles"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=defaultSweep["size"])
+    parser.add_argument("--smoothing", type=int, nargs="+", default=defaultSweep["smoothingR"])
+    parser.add_argument("--vector-radius", type=int, nargs="+", default=defaultSweep["vectorRadius"])
+    parser.add_argument("--solver", nargs="+", choices=["field", "sph"], default=defaultSweep["solver"])
+    parser.add_argument("--cell-sizes", type=int, nargs="+", default=defaultSweep["cellSize"])
+    parser.add_argument("--backend", nargs="+", choices=["numpy", "numba"], default=defaultSweep["backend"])
+    parser.add_argument("--workers", type=int, nargs="+", default=defaultSweep["workers"],
+                        help="worker processes to run the field solver over, 0 runs it in this process")
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=defaultSweep["tileSize"],
+                        help="tile sizes to build and draw the fields on, 0 builds the whole fields")
+    parser.add_argument("--field-dtypes", nargs="+", choices=["float64", "float32", "float16"],
+                        default=defaultSweep["fieldDtype"], help="types to store the density and vector fields as")
+    parser.add_argument("--sampling", nargs="+", choices=["auto", "window", "table"], default=defaultSweep["sampling"],
+                        help="how the particles sum the fields around them")
+    parser.add_argument("--grid", action="store_true", help="run every combination instead of one parameter at a time")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-draw", action="store_true", help="do not time the drawing")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved JSON runs")
+    args = parser.parse_args()
+
+    if args.compare:
+        compareRuns(*args.compare)
+        return
+
+    sweep = {"particles": args.particles, "size": args.sizes, "smoothingR": args.smoothing, "vectorRadius": args.vector_radius,
+             "solver": args.solver, "cellSize": args.cell_sizes,
+             "backend": args.backend, "workers": args.workers, "tileSize": args.tile_sizes, "fieldDtype": args.field_dtypes,
+             "sampling": args.sampling}
+    run = runBenchmarks(makeCases(sweep, args.grid), args.steps, args.warmup, not args.no_draw, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(run, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1705 @@
+import numpy as np
+import time
+import types
+
+import FluidSimJit
+import FluidSimKernels
+from FluidSimKernels import smoothingKernel
+
+#Core of the fluid simulation. Everything in here only uses numpy so the simulation can run without pygame or a display,
+#the pygame front end in FluidSim_SabaterAlvoGomez.py draws it through the window it passes in as the background.
+#For the github repository follow this link: https://github.com/pablosabaterlp/EECE2140FinalProject.git
+
+#Class for a particle
+class particle:
+
+    #Initializing the particle class with the atributes of each particle inclduing x and y positions, aswell as 
+    #radius and color
+    def __init__(self, radius, x, y, color):
+        self.radius = radius
+        self.color = color
+        self.posx = x
+        self.posy = y
+        self.velocityMag = 0
+
+        self.velocity = [0, 0]
+
+    #Drawing the particles onto the screen
+    def draw(self, background):
+        background.drawEllipse(self.color, (self.posx-self.radius, self.posy-self.radius, 2*self.radius + 1, 2*self.radius + 1))
+    
+    #Velocity Methods
+    #====================================
+        
+    #Method to add random velocity to each particle
+    def updateVelocityRandom(self, timeStep):
+        self.velocity[0] += 3*timeStep*np.random.standard_normal()
+        self.velocity[1] += 3*timeStep*np.random.standard_normal()
+
+    #Method to update the velocity of a particle if it collides into a wall
+    def updateVelocityWallColl(self, background, dampingcoeff):
+        if self.posx >= background.width - self.radius - 1 or self.posx <= self.radius:
+            self.velocity[0] *= -1*dampingcoeff
+
+        if self.posy >= background.height - self.radius - 1 or self.posy <= self.radius:
+            self.velocity[1] *= -1*dampingcoeff
+
+    #Method to update the y velocity of a particle with gravity
+    def updateVelocityWithG(self, g, timeStep):
+        self.velocity[1] += g*timeStep
+    
+    #Method to update the velocity of a particle using the vector field.
+    def updateVelocityVField(self, timeStep, densityVal, vField):
+        radius = vField.radius
+        px = round(self.posx)
+        py = round(self.posy)
+
+        #Calculating bounds to use for vector field matrix and distanceMultiplier matrix so that no idex error occurse
+        #(would happen if the particles are close to the edges and they try to use indexes not in the scene)
+        xmin, rxmin = (max(0, px-radius), max(0, radius-px))
+        xmax, rxmax = (min(vField.vectorWidth, px+radius), min(2*radius, radius + vField.vectorWidth-px))
+        ymin, rymin = (max(0, py-radius), max(0, radius-py))
+        ymax, rymax = (min(vField.vectorWidth, py+radius), min(2*radius, radius + vField.vectorHeight-py))
+
+        #Updating x velocity of the particle with sum of all x vectors of vector field, multiplied by how far away they are from the particle
+        #(distanceMultipliier matrix), aswell as the timeStep, and the density which will affect how powerfull they are
+        self.velocity[0] += np.sum(vField.field[ymin:ymax, xmin:xmax, 0]*vField.distanceMultiplier[rymin:rymax, rxmin:rxmax])*timeStep*densityVal
+        
+        #Same for y velocity of the particle
+        self.velocity[1] += np.sum(vField.field[ymin:ymax, xmin:xmax, 1]*vField.distanceMultiplier[rymin:rymax, rxmin:rxmax])*timeStep*densityVal
+    
+    #Method to decelerate particles to attempt to simulate surface tensiono
+    def updateVelocityDeceleration(self, dField):
+
+        radius = dField.smoothingRadius
+        px = round(self.posx)
+        py = round(self.posy)
+
+        #Calculating bounds to use for density field matrix
+        xmin= max(0, px-radius)
+        xmax= min(dField.fieldWidth, px+radius)
+        ymin= max(0, py-radius)
+        ymax= min(dField.fieldHeight, py+radius)
+
+        #setting the multiplier that will affect the particles velocity proportional to how dense the field is around the particle
+        #with a limit of 0.8
+        multiplier = 1 - 0.2*np.sum(dField.field[ymin:ymax, xmin:xmax])/((2*radius+1)**2)
+
+        #multiplying the velocities by the multiplier to decrease them
+        self.velocity[0] *= multiplier
+        self.velocity[1] *= multiplier
+    
+    #Method to update the velocity of the particles using all of the different velocity methods
+    def updateVelocity(self, g, dampingcoeff, timeStep, background, gtrue, rtrue, dtrue, densityVal, vField, densityF):
+        #If statements to check which velocity methods should be used to affect the particle
+        if gtrue:
+            self.updateVelocityWithG(g, timeStep)
+        if rtrue:
+            self.updateVelocityRandom(timeStep)
+        if dtrue:
+            self.updateVelocityDeceleration(densityF)
+
+        #Update the velocity of using the vector field
+        self.updateVelocityVField(timeStep, densityVal, vField)
+        
+        #Find the magnitude of the velocity of the particle
+        self.velocityMag = (self.velocity[0]**2 + self.velocity[1]**2)**0.5
+
+        #Update the velocity using teh wall collision method
+        self.updateVelocityWallColl(background, dampingcoeff)
+    #====================================
+
+    #Position Methods
+    #====================================
+    
+    #Method to check if a particle has collided into a wall
+    def checkWallCollision(self, pos, velocity, wall):
+        #Checking if the particles position +- its radius is outside one of the walls bounds
+        #If so, not adding velocity but making it touch the wall dirrectly
+        #Also reversing its velocity so it bounces backwards
+        if pos + velocity >= self.radius and pos + velocity <= wall - 1 - self.radius:
+            pos = pos + velocity
+        else:
+            pos = self.radius if pos < wall/10 else wall - self.radius - 1
+        
+        return pos
+    
+    #Method to update the position with the particles velocity. It simoltenusly checks for wall collisions
+    def updatePosition(self, background):
+
+        self.posx = self.checkWallCollision(self.posx, self.velocity[0], background.width)
+        self.posy = self.checkWallCollision(self.posy, self.velocity[1], background.height)
+    
+    #====================================
+    #Method to update the color of the particle based on its velocity
+    def updateColor(self):
+        newColor = list(self.color)
+
+        newColor[0] = round(255 * min(1, self.velocityMag/10))
+        self.color = tuple(newColor)
+
+#Function to sum a windowed product of a field and a kernel around many positions at once. The window around each
+#position covers the rows/columns pos-radius up to pos+radius-1 and is cut off at the edges of the field, which is
+#the same area the per-particle slices in the particle class use. The field is padded with zeros so the cut off
+#parts of the window simply add nothing, and the windows are gathered in chunks of about chunkSize values to keep the
+#memory used small (small chunks are also faster since they stay in the cache). With a frameWorkspace the padded field
+#is kept in it and only its middle is copied over each time. The sums are always added up as float64, even for
+#float32 or float16 fields
+def windowSums(field, kernel, px, py, radius, chunkSize=2**16, workspace=None):
+    height, width = field.shape[:2]
+    kernel = kernel[:2*radius, :2*radius]
+    pad = 2*radius
+
+    if workspace is None:
+        padWidth = ((pad, pad), (pad, pad)) + ((0, 0),)*(field.ndim - 2)
+        paddedField = np.pad(field, padWidth)
+    else:
+        #The edges of the buffer are never written to, so they stay 0
+        paddedField = workspace.buffer("paddedField", (height + 2*pad, width + 2*pad) + field.shape[2:], field.dtype)
+        paddedField[pad:pad+height, pad:pad+width] = field
+    windows = np.lib.stride_tricks.sliding_window_view(paddedField, (2*radius, 2*radius), axis=(0, 1))
+
+    #Positions more than a radius outside of the field do not touch it at all
+    inside = (px > -radius) & (px < width + radius) & (py > -radius) & (py < height + radius)
+    sums = np.zeros((len(px),) + field.shape[2:])
+    index = np.flatnonzero(inside)
+
+    step = max(1, chunkSize // (kernel.size * int(np.prod(field.shape[2:]))))
+    for start in range(0, len(index), step):
+        chunk = index[start:start+step]
+        gathered = windows[py[chunk] + radius, px[chunk] + radius]
+        sums[chunk] = np.einsum('n...ij,ij->n...', gathered, kernel, dtype=sums.dtype)
+
+    return sums
+
+#Function to get how many cells of cellSize pixels are needed to cover a length in pixels
+def gridSize(pixels, cellSize):
+    return -(-pixels // cellSize)
+
+#Function to turn positions in pixels into positions in the cells of a grid with cellSize pixels per cell, where cell i
+#covers the pixels i*cellSize up to (i+1)*cellSize-1, so the middle of a cell lands on a whole number
+def cellCoordinates(positions, cellSize):
+    return (np.asarray(positions, dtype=float) - (cellSize - 1)/2) / cellSize
+
+#Function to get sums of a field at positions in pixels on a field with cellSize pixels per cell, where sumsAt(px, py)
+#gives the sums at whole cells. For fields with a cell per pixel the positions are rounded to the nearest pixel like
+#the particle class does, for coarser fields the sums at the 4 cells around each position are interpolated bilinearly
+#so the particles feel the field change smoothly
+def sampleCells(sumsAt, positions, cellSize):
+    if cellSize == 1:
+        pixels = np.rint(positions).astype(np.intp)
+        return sumsAt(pixels[:, 0], pixels[:, 1])
+
+    cells = cellCoordinates(positions, cellSize)
+    corner = np.floor(cells)
+    fraction = cells - corner
+    corner = corner.astype(np.intp)
+
+    sums = 0
+    for dx in (0, 1):
+        for dy in (0, 1):
+            weight = np.abs(1 - dx - fraction[:, 0]) * np.abs(1 - dy - fraction[:, 1])
+            cornerSums = sumsAt(corner[:, 0] + dx, corner[:, 1] + dy)
+            sums = sums + cornerSums * weight.reshape((-1,) + (1,)*(cornerSums.ndim - 1))
+
+    return sums
+
+#Function to use windowSums at positions in pixels on a field with cellSize pixels per cell
+def sampleWindowSums(field, kernel, positions, radius, cellSize, workspace=None):
+    return sampleCells(lambda px, py: windowSums(field, kernel, px, py, radius, workspace=workspace), positions, cellSize)
+
+#Function to get the smallest length of at least n whose only prime factors are 2, 3 and 5, which numpy's FFTs are
+#much faster on than on lengths with large prime factors
+def fastLength(n):
+    best = 2 * n
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+
+    return best
+
+#Function to build a table of the same sums windowSums finds, at every cell of a field and one cell past each of its
+#edges, by correlating the field with the kernel using FFTs. This only depends on the size of the field, not on the
+#number of positions or the size of the kernel, and the sums match windowSums up to rounding. Cell (x, y) of the
+#field is at [y + 1, x + 1] of the table, which is a view into a buffer of the workspace, like the padded field, the
+#transforms and the transform of the kernel
+def windowSumTable(field, kernel, radius, workspace):
+    height, width = field.shape[:2]
+    kernel = kernel[:2*radius, :2*radius].astype(np.float64)
+
+    #Correlating with the kernel is convolving with the kernel flipped along both axes, the transforms are at least as
+    #large as the whole convolution so it does not wrap around
+    shape = (fastLength(height + 2*radius + 1), fastLength(width + 2*radius + 1))
+    kernelSpectrum = workspace.buffer("tableSpectrum", (shape[0], shape[1]//2 + 1), complex,
+                                      lambda: np.fft.rfft2(kernel[::-1, ::-1], shape))
+
+    #The field is padded by a cell on each side so the table also covers the cells just past the edges, and with 0s up
+    #to the size of the transforms, with the components of a vector field first so each one is transformed as one
+    #contiguous image. Only the cells of the field are ever written, so the rest of the buffer stays 0
+    padded = workspace.buffer("tablePadded", field.shape[2:] + shape)
+    np.moveaxis(padded, (-2, -1), (0, 1))[1:height + 1, 1:width + 1] = field
+    full = fftConvolve(padded, kernelSpectrum, workspace, "tableSums")
+
+    return np.moveaxis(full[..., radius - 1:radius + height + 1, radius - 1:radius + width + 1], (-2, -1), (0, 1))
+
+#Whether the transforms of np.fft can be written into an out= array, which they can from numpy 2
+fftOut = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
+#Function to convolve padded, an image or a stack of them along its first axes that is already padded with 0s to the
+#size of the transforms, with a kernel from its rfft2. The spectrum and the result are written into buffers of the
+#workspace starting with name. Before numpy 2 np.fft has no out=, so the transforms are made as new arrays then
+def fftConvolve(padded, kernelSpectrum, workspace, name):
+    shape = padded.shape
+    spectrum = workspace.buffer(name + "Spectrum", shape[:-1] + (shape[-1]//2 + 1,), complex)
+    full = workspace.buffer(name + "Full", shape)
+    if not fftOut:
+        full[...] = np.fft.irfft2(np.fft.rfft2(padded) * kernelSpectrum, shape[-2:])
+        return full
+
+    np.fft.rfft2(padded, out=spectrum)
+    spectrum *= kernelSpectrum
+    #The same two transforms irfft2 does, with the one along the columns done in place since irfft2 makes a new array
+    #for it
+    np.fft.ifft(spectrum, axis=-2, out=spectrum)
+    np.fft.irfft(spectrum, shape[-1], axis=-1, out=full)
+
+    return full
+
+#Function to read the sums of a windowSumTable at the cells px, py. Cells further than one cell past the edges of the
+#field read the sums at the closest edge, the walls keep the particles from ever getting there
+def tableSums(table, px, py):
+    rows = np.clip(py + 1, 0, table.shape[0] - 1)
+    cols = np.clip(px + 1, 0, table.shape[1] - 1)
+
+    return table[rows, cols]
+
+#Function to build the summed-area table of a field in a buffer of the workspace, where [y, x] holds the sum of the
+#field above and left of cell (x, y). It is added up as float64 whatever the dtype of the field is
+def boxSumTable(field, workspace):
+    height, width = field.shape
+    #Row 0 and column 0 are never written to, so they stay 0
+    table = workspace.buffer("boxSumTable", (height + 1, width + 1))
+    np.cumsum(field, axis=0, dtype=table.dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+
+    return table
+
+#Function to get the sums of the field of a summed-area table over the (2*radius, 2*radius) boxes around the cells
+#px, py, the same boxes windowSums sums with a kernel of ones, from the 4 corners of each box
+def boxSums(table, px, py, radius):
+    height, width = table.shape[0] - 1, table.shape[1] - 1
+    top, bottom = np.clip(py - radius, 0, height), np.clip(py + radius, 0, height)
+    left, right = np.clip(px - radius, 0, width), np.clip(px + radius, 0, width)
+
+    return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+#Function to pick how the sums of a field are sampled when method is "auto". The windows are summed when that goes
+#through at most as many values (windowCost) as building a table does (tableCost), otherwise the table is built.
+#Both costs only depend on the number of particles and the size of the whole field, so a field split into tiles
+#picks the same method as one that is not
+def samplingMethod(method, windowCost, tableCost):
+    if method == "auto":
+        method = "window" if windowCost <= tableCost else "table"
+    if method not in ("window", "table"):
+        raise ValueError("Unknown sampling method: " + str(method))
+
+    return method
+
+#Function to make an image of a field big enough to draw onto a width by height screen, by repeating each cell
+#cellSize times along both axes. The image is indexed (x, y) like the screen. With a frameWorkspace the bigger image
+#is written into a buffer of it instead of a new array
+def upscaleImage(image, cellSize, width, height, workspace=None):
+    if cellSize == 1:
+        return image
+    if workspace is None:
+        return np.repeat(np.repeat(image, cellSize, axis=0), cellSize, axis=1)[:width, :height]
+
+    cols, rows = image.shape
+    upscaled = workspace.buffer("upscaledImage", (cols*cellSize, rows*cellSize), image.dtype)
+    upscaled.reshape(cols, cellSize, rows, cellSize)[...] = image[:, None, :, None]
+
+    return upscaled[:width, :height]
+
+#Function to round an image of pixel values into a uint32 buffer of the workspace, the same way pygame's blit_array
+#converts float arrays, so blitting it does not need a converted copy
+def pixelImage(image, workspace):
+    np.rint(image, out=image)
+    pixels = workspace.buffer("pixels", image.shape, np.uint32)
+    np.copyto(pixels, image, casting="unsafe")
+
+    return pixels
+
+#Function to draw an image of a field (indexed (x, y) in cells) onto the background. Without regions the whole image is
+#drawn, with a list of (rows, cols) regions of the field only those parts of the image are rounded, upscaled and
+#copied onto the window, which is all there is to draw when the rest of the image is black like the cleared window
+def drawFieldImage(image, cellSize, background, workspace, regions=None):
+    if regions is None:
+        pixels = pixelImage(image, workspace)
+        background.blitArray(upscaleImage(pixels, cellSize, background.width, background.height, workspace))
+        return
+
+    pixels = workspace.buffer("pixels", image.shape, np.uint32)
+    for rows, cols in regions:
+        np.rint(image[cols, rows], out=image[cols, rows])
+        np.copyto(pixels[cols, rows], image[cols, rows], casting="unsafe")
+        x, y = cols.start*cellSize, rows.start*cellSize
+        block = upscaleImage(pixels[cols, rows], cellSize, background.width - x, background.height - y)
+        background.blitArrayAt(block, x, y)
+
+#Function to get the largest value of a field that is 0 outside of a list of (rows, cols) regions, only reading those
+#regions. covered says whether the regions cover the whole field, otherwise the 0s outside of them count too
+def regionsMax(field, regions, covered):
+    peaks = [field[rows, cols].max() for rows, cols in regions]
+    if not covered:
+        peaks.append(0.0)
+
+    return max(peaks)
+
+#Function to get the dtype the image of a field with that dtype is drawn with. float16 cannot hold the colors of the
+#vector field (up to 255**3), so the images of float16 and float32 fields are float32 and the ones of float64 fields
+#stay float64
+def imageDtype(dtype):
+    return np.result_type(dtype, np.float32)
+
+#Class for the arrays the fields use every frame, kept from one frame to the next instead of being allocated again.
+#Each buffer is made the first time it is asked for and only made again when it is asked for with another shape or
+#dtype, starting out filled with initial (a value, an array to broadcast, or a function returning one)
+class frameWorkspace:
+
+    def __init__(self):
+        self.buffers = {}
+
+    #Method to get the buffer with a name, making it if it does not exist yet or has a different shape or dtype
+    def buffer(self, name, shape, dtype=float, initial=0):
+        shape = tuple(shape)
+        array = self.buffers.get(name)
+        if array is None or array.shape != shape or array.dtype != np.dtype(dtype):
+            array = np.empty(shape, dtype)
+            array[...] = initial() if callable(initial) else initial
+            self.buffers[name] = array
+
+        return array
+
+    #Method to drop every buffer, for when what they were made for changes, like the radius of a field
+    def clear(self):
+        self.buffers.clear()
+
+    #Method to get how many bytes all of the buffers take up
+    def nbytes(self):
+        return sum(array.nbytes for array in self.buffers.values())
+
+#Function to make a property for one of the arrays of the particle pool. Getting it gives the rows of the live
+#particles, a view into the pool, and setting it copies the values into those rows
+def poolArray(name):
+    def get(self):
+        return self.pool[name][:self.count]
+
+    def set(self, values):
+        self.pool[name][:self.count] = values
+
+    return property(get, set)
+
+#Class for splitting a field into square tiles of tileSize by tileSize cells, and keeping track of which tiles are
+#active, the ones that the kernel of at least one particle reaches. Everything outside of the active tiles of the
+#density field is 0, so the fields only have to be built and drawn on the active tiles. The tiles are handed out as
+#(rows, cols) regions of the field, one for every run of neighbouring active tiles in a row of tiles
+class tileMap:
+
+    def __init__(self, height, width, tileSize=32):
+        self.height = height
+        self.width = width
+        self.tileSize = tileSize
+        self.tilesHigh = gridSize(height, tileSize)
+        self.tilesWide = gridSize(width, tileSize)
+        self.active = np.zeros((self.tilesHigh, self.tilesWide), dtype=bool)
+
+    #Method to mark the tiles reached by the cells px-reach up to px+reach-1 and py-reach up to py+reach-1 around
+    #every particle as the active ones. Every particle adds 1 to the corner tiles of its area in a grid of differences,
+    #which the cumulative sums along both axes turn into how many particles reach each tile
+    def update(self, px, py, reach):
+        size = self.tileSize
+        left = np.clip((px - reach) // size, 0, self.tilesWide - 1)
+        right = np.clip((px + reach - 1) // size, 0, self.tilesWide - 1) + 1
+        top = np.clip((py - reach) // size, 0, self.tilesHigh - 1)
+        bottom = np.clip((py + reach - 1) // size, 0, self.tilesHigh - 1) + 1
+
+        stride = self.tilesWide + 1
+        corners = np.concatenate((top*stride + left, top*stride + right, bottom*stride + left, bottom*stride + right))
+        signs = np.repeat([1, -1, -1, 1], len(px))
+        counts = np.bincount(corners, signs, minlength=(self.tilesHigh + 1)*stride).reshape(-1, stride)
+
+        self.active = np.cumsum(np.cumsum(counts, axis=0), axis=1)[:-1, :-1] > 0
+
+    #Method to get the tiles covering the cells rows (a slice) and cols of the field as a boolean grid of tiles
+    def tilesOf(self, rows, cols):
+        covered = np.zeros_like(self.active)
+        size = self.tileSize
+        if rows.stop > rows.start and cols.stop > cols.start:
+            covered[rows.start//size:(rows.stop - 1)//size + 1, cols.start//size:(cols.stop - 1)//size + 1] = True
+
+        return covered
+
+    #Method to get the (rows, cols) regions of the field covered by a boolean grid of tiles, the active ones by default
+    def regions(self, tiles=None):
+        tiles = self.active if tiles is None else tiles
+        edges = np.diff(np.pad(tiles.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+        starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+
+        size = self.tileSize
+        return [(slice(row*size, min(self.height, (row + 1)*size)), slice(start*size, min(self.width, end*size)))
+                for row, start, end in zip(starts[0].tolist(), starts[1].tolist(), ends.tolist())]
+
+#Class for all the particles of the simulation stored as contiguous arrays instead of one object per particle.
+#Every method does the same work as the matching method of the particle class, but for all particles at once.
+#The arrays are a pool with room for capacity particles, of which the first count are live, so adding particles
+#only writes into the rows after them and removing particles moves the ones that are left down. The pool only has
+#to grow (doubling its capacity) when more particles are added than it has room for
+class particleSystem:
+
+    position = poolArray("position")
+    velocity = poolArray("velocity")
+    speed = poolArray("speed")
+    color = poolArray("color")
+    radius = poolArray("radius")
+
+    #Initializing the particle system with an (N, 2) array of x and y positions, a radius and a color
+    #which are shared by all particles to start with, and room for capacity particles (at least N)
+    def __init__(self, radius, positions, color, capacity=None):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        amnt = len(positions)
+        capacity = max(amnt, capacity or 0)
+
+        self.count = amnt
+        self.pool = {
+            "position": np.zeros((capacity, 2)),
+            "velocity": np.zeros((capacity, 2)),
+            "speed": np.zeros(capacity),
+            "color": np.tile(np.asarray(color, dtype=int), (capacity, 1)),
+            "radius": np.full(capacity, radius, dtype=float),
+        }
+        self.position = positions
+
+    def __len__(self):
+        return self.count
+
+    #Method to get how many particles the pool has room for
+    def capacity(self):
+        return len(self.pool["position"])
+
+    #Method to make room for at least amnt particles, doubling the capacity until they fit
+    def reserve(self, amnt):
+        capacity = max(1, self.capacity())
+        if amnt <= self.capacity():
+            return
+        while capacity < amnt:
+            capacity *= 2
+
+        for name, array in self.pool.items():
+            grown = np.zeros((capacity,) + array.shape[1:], array.dtype)
+            grown[:self.count] = array[:self.count]
+            self.pool[name] = grown
+
+    #Method to add particles at an (K, 2) array of positions, with an (K, 2) array of velocities (or none), a color
+    #and a radius, into the rows after the live particles
+    def spawn(self, positions, velocities=None, color=(0, 163, 108), radius=4):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        start, end = self.count, self.count + len(positions)
+        self.reserve(end)
+
+        self.pool["position"][start:end] = positions
+        self.pool["velocity"][start:end] = 0 if velocities is None else velocities
+        self.pool["speed"][start:end] = 0
+        self.pool["color"][start:end] = color
+        self.pool["radius"][start:end] = radius
+        self.count = end
+
+    #Method to add a single particle at a position with a velocity, used when more particles are poured in
+    def addParticle(self, radius, x, y, color, vx=0, vy=0):
+        self.spawn([[x, y]], [[vx, vy]], color, radius)
+
+    #Method to remove the particles where a boolean array of the live particles is true. The particles that are left
+    #keep their order and are moved down to the start of the pool, nothing is allocated again. Returns how many
+    #particles were removed
+    def removeParticles(self, remove):
+        keep = np.flatnonzero(~np.asarray(remove, dtype=bool))
+        if len(keep) == self.count:
+            return 0
+
+        for array in self.pool.values():
+            array[:len(keep)] = array[keep]
+        removed = self.count - len(keep)
+        self.count = len(keep)
+
+        return removed
+
+    #Method to set the color of every particle back to one color
+    def resetColor(self, color):
+        self.color[:] = color
+
+    #Method to get the positions rounded to the nearest pixel, the same way round() does for each particle
+    def pixelPositions(self):
+        pixels = np.rint(self.position).astype(np.intp)
+        return pixels[:, 0], pixels[:, 1]
+
+    #Drawing the particles onto the screen, all in one batch with the background's drawEllipses
+    def draw(self, background):
+        rects = np.empty((len(self), 4))
+        rects[:, :2] = self.position - self.radius[:, None]
+        rects[:, 2:] = (2*self.radius + 1)[:, None]
+        background.drawEllipses(self.color, rects)
+
+    #Drawing the particles one at a time with the background's drawEllipse, the way each particle object draws itself
+    def drawEach(self, background):
+        for (x, y), r, color in zip(self.position, self.radius, self.color):
+            background.drawEllipse(tuple(color), (x-r, y-r, 2*r + 1, 2*r + 1))
+
+    #Velocity Methods
+    #====================================
+
+    #Method to add random velocity to each particle. The random numbers are drawn in the same order as when
+    #looping over the particle objects, so a seeded run gives the same result. A substep scale times as long as the full
+    #time step adds a kick 1/sqrt(scale) times as strong for its length, so the independent kicks of all the substeps of
+    #a time step add up to the same spread as one kick of a whole time step, however many substeps there are
+    def updateVelocityRandom(self, timeStep, scale=1):
+        self.velocity += 3*timeStep/scale**0.5*np.random.standard_normal(self.velocity.shape)
+
+    #Method to update the velocity of the particles that collide into a wall
+    def updateVelocityWallColl(self, background, dampingcoeff):
+        posx = self.position[:, 0]
+        posy = self.position[:, 1]
+
+        hitX = (posx >= background.width - self.radius - 1) | (posx <= self.radius)
+        hitY = (posy >= background.height - self.radius - 1) | (posy <= self.radius)
+
+        self.velocity[hitX, 0] *= -1*dampingcoeff
+        self.velocity[hitY, 1] *= -1*dampingcoeff
+
+    #Method to update the y velocity of the particles with gravity
+    def updateVelocityWithG(self, g, timeStep):
+        self.velocity[:, 1] += g*timeStep
+
+    #Method to update the velocity of the particles using the vector field. Each cell of a coarse field stands for
+    #cellSize*cellSize pixels, so the sum is scaled by that to push as hard as a field with a cell per pixel
+    def updateVelocityVField(self, timeStep, densityVal, vField):
+        sums = vField.sampleSums(self.position)
+
+        self.velocity += sums*vField.cellSize**2*timeStep*densityVal
+
+    #Method to decelerate the particles proportional to how dense the field is around each of them. The deceleration
+    #is for a whole time step, a step scale times as long slows them down by the multiplier to the power of scale
+    #(keeping its sign, very dense areas give a negative multiplier)
+    def updateVelocityDeceleration(self, dField, scale=1):
+        radius = dField.smoothingRadius
+        sums = dField.sampleBoxSums(self.position)
+
+        multiplier = 1 - 0.2*sums/((2*radius+1)**2)
+        if scale != 1:
+            multiplier = np.sign(multiplier) * np.abs(multiplier)**scale
+        self.velocity *= multiplier[:, None]
+
+    #Method to update the velocity of the particles using all of the different velocity methods. timeStep is the
+    #length of this step and scale how many of the simulation's full time steps it is
+    def updateVelocity(self, g, dampingcoeff, timeStep, background, gtrue, rtrue, dtrue, densityVal, vField, densityF, scale=1):
+        if gtrue:
+            self.updateVelocityWithG(g, timeStep)
+        if rtrue:
+            self.updateVelocityRandom(timeStep, scale)
+        if dtrue:
+            self.updateVelocityDeceleration(densityF, scale)
+
+        self.updateVelocityVField(timeStep, densityVal, vField)
+
+        self.speed = np.hypot(self.velocity[:, 0], self.velocity[:, 1])
+
+        self.updateVelocityWallColl(background, dampingcoeff)
+
+    #Method to do all of updateVelocity, updatePosition and updateColor in the one compiled loop of FluidSimJit. It
+    #only works on fields with a cell per pixel
+    def updateJit(self, g, dampingcoeff, timeStep, background, gtrue, rtrue, dtrue, densityVal, vField, dField, colorByVelocity, scale=1):
+        randomForce = np.random.standard_normal(self.velocity.shape) if rtrue else np.zeros((0, 2))
+
+        FluidSimJit.stepParticles(self.position, self.velocity, self.speed, self.color, self.radius,
+                                  vField.field, vField.distanceMultiplier, vField.radius, dField.field, dField.smoothingRadius,
+                                  randomForce, g, dampingcoeff, timeStep, densityVal, background.width, background.height,
+                                  gtrue, rtrue, dtrue, colorByVelocity, scale)
+
+    #Method to update the velocity of the particles using the forces between the particles of an sphSolver instead of
+    #the fields, after its densities have been updated. The viscosity takes the place of the deceleration
+    def updateVelocitySPH(self, g, dampingcoeff, timeStep, background, gtrue, rtrue, dtrue, densityVal, solver, mouseVectors=None, scale=1):
+        if gtrue:
+            self.updateVelocityWithG(g, timeStep)
+        if rtrue:
+            self.updateVelocityRandom(timeStep, scale)
+
+        self.velocity += solver.acceleration(self.position, self.velocity, dtrue)*timeStep*densityVal
+        if mouseVectors is not None:
+            self.velocity += mouseVectors*timeStep*densityVal
+
+        self.speed = np.hypot(self.velocity[:, 0], self.velocity[:, 1])
+
+        self.updateVelocityWallColl(background, dampingcoeff)
+    #====================================
+
+    #Position Methods
+    #====================================
+
+    #Method to move the particles along one axis, the particles that would end up outside of a wall are put
+    #right against it instead, on the side they are closest to
+    def checkWallCollision(self, pos, velocity, wall):
+        newPos = pos + velocity
+        inside = (newPos >= self.radius) & (newPos <= wall - 1 - self.radius)
+        against = np.where(pos < wall/10, self.radius, wall - self.radius - 1)
+
+        return np.where(inside, newPos, against)
+
+    #Method to update the positions with the particles velocities. It simoltenusly checks for wall collisions.
+    #The velocities are in pixels per full time step, so a step scale times as long moves the particles scale times as far
+    def updatePosition(self, background, scale=1):
+        self.position[:, 0] = self.checkWallCollision(self.position[:, 0], self.velocity[:, 0]*scale, background.width)
+        self.position[:, 1] = self.checkWallCollision(self.position[:, 1], self.velocity[:, 1]*scale, background.height)
+
+    #====================================
+    #Method to update the color of the particles based on their speed
+    def updateColor(self):
+        self.color[:, 0] = np.rint(255 * np.minimum(1, self.speed/10))
+
+#Class for the density field calculations
+class densityField():
+
+    #Initialize the density field object that has the attributes of screen width and height,
+    #and the radius around each particle. Every cell of the field covers cellSize by cellSize pixels, so the field
+    #and the smoothing radius are measured in cells, which are the same as pixels unless a cellSize is given.
+    #The field and its kernel are stored as dtype, float32 or float16 take a half or a quarter of the memory of float64
+    #for very large scenes, with the precision of that type
+    def __init__(self, width, height, radius, cellSize=1, dtype=np.float64):
+        self.width = width
+        self.height = height
+        self.cellSize = cellSize
+        self.fieldWidth = gridSize(width, cellSize)
+        self.fieldHeight = gridSize(height, cellSize)
+        self.field = np.zeros((self.fieldHeight, self.fieldWidth), dtype)
+        #Buffers reused every frame for building, sampling and drawing the field
+        self.workspace = frameWorkspace()
+        #tileMap of the tiles the particles reach, None when the whole field is always built and drawn
+        self.tiles = None
+        #How sampleBoxSums sums the field around the particles, "window", "table" or "auto"
+        self.sampling = "auto"
+        self.setRadius(radius)
+
+    #Method to only build and draw the field on the tiles of tileSize cells the particles reach
+    def useTiles(self, tileSize=32):
+        self.tiles = tileMap(self.fieldHeight, self.fieldWidth, tileSize)
+        self.field.fill(0)
+
+    #Method to get the (rows, cols) regions of the field that can be non zero, the whole field without tiles
+    def regions(self):
+        if self.tiles is None:
+            return [(slice(0, self.fieldHeight), slice(0, self.fieldWidth))]
+        return self.tiles.regions()
+
+    #Method to change the smoothing radius, given in pixels. The matrix added onto the density field for each particle
+    #comes from the stencil cache of FluidSimKernels, and the buffers made for the old radius are dropped
+    def setRadius(self, radius):
+        self.smoothingRadius = max(1, round(radius / self.cellSize))
+        self.addDensity = FluidSimKernels.stencil("smoothing", self.smoothingRadius, self.field.dtype)
+        self.workspace.clear()
+
+    #Method to update the density field after actions have been performed to it
+    def updateField(self, particle):
+        self.updateFieldAt(particle.posx, particle.posy)
+
+    #Method to add the density of a particle at a position in pixels to the density field
+    def updateFieldAt(self, x, y):
+        px, py = np.rint(cellCoordinates((x, y), self.cellSize)).astype(int)
+
+        xmin, rxmin = (max(0, px-self.smoothingRadius), max(0, self.smoothingRadius-px))
+        xmax, rxmax = (min(self.fieldWidth, px+self.smoothingRadius), min(2*self.smoothingRadius, self.smoothingRadius + self.fieldWidth-px))
+        ymin, rymin = (max(0, py-self.smoothingRadius), max(0, self.smoothingRadius-py))
+        ymax, rymax = (min(self.fieldHeight, py+self.smoothingRadius), min(2*self.smoothingRadius, self.smoothingRadius + self.fieldHeight-py))
+
+        self.field[ymin:ymax, xmin:xmax] += self.addDensity[rymin:rymax, rxmin:rxmax]
+
+    #Method to add the density of every particle at once from an (N, 2) array of positions. The same clipped area of
+    #addDensity is added for each particle as in updateFieldAt. "scatter" adds all the pixels with np.add.at, which
+    #only changes the order the values are added in compared to the per-particle loop. "convolve" counts the particles
+    #on each pixel and convolves the counts with addDensity using FFTs, which only depends on the field size and is faster
+    #for very crowded scenes but only matches up to rounding. "jit" uses the compiled loop of FluidSimJit, filling the
+    #rows of the field in parallel. "auto" picks whichever of scatter and convolve should be cheaper.
+    #With tiles the tiles the particles reach are found first, and "auto" always scatters since the rounding of the
+    #convolution would leave tiny values all over the field instead of only on those tiles
+    def updateFieldBulk(self, positions, method="auto", chunkSize=2**22):
+        radius = self.smoothingRadius
+        pixels = np.rint(cellCoordinates(positions, self.cellSize).reshape(-1, 2)).astype(np.intp)
+        px, py = pixels[:, 0], pixels[:, 1]
+
+        #Particles more than a radius outside of the field do not add anything to it
+        inside = (px > -radius) & (px < self.fieldWidth + radius) & (py > -radius) & (py < self.fieldHeight + radius)
+        px, py = px[inside], py[inside]
+
+        if self.tiles is not None:
+            self.tiles.update(px, py, radius)
+            if method == "auto":
+                method = "scatter"
+        if method == "auto":
+            method = self.bulkMethod(len(px))
+
+        if method == "scatter":
+            self.scatterDensity(px, py, chunkSize)
+        elif method == "convolve":
+            self.convolveDensity(px, py)
+        elif method == "jit":
+            order = np.argsort(py, kind="stable")
+            FluidSimJit.splatDensity(self.field, self.addDensity, px[order], py[order], radius)
+        else:
+            raise ValueError("Unknown density method: " + str(method))
+
+    #Method to get whichever of "scatter" and "convolve" should be cheaper for count particles inside of the field
+    def bulkMethod(self, count):
+        scatterCost = count * np.count_nonzero(self.addDensity)
+        convolveCost = 20 * (self.fieldHeight + 4*self.smoothingRadius) * (self.fieldWidth + 4*self.smoothingRadius)
+
+        return "scatter" if scatterCost <= convolveCost else "convolve"
+
+    #Method to scatter-add the kernel of every particle into the field, skipping the kernel pixels that are zero.
+    #Particles whose whole kernel is inside of the field only need one offset added to their pixel index, the
+    #ones close to the edges also drop the kernel pixels that fall outside of the field. The pixel indices and the
+    #weights of each chunk are written into buffers of the workspace, which have room for the next power of 2 of
+    #particles so they are not made again every time a particle is poured in
+    def scatterDensity(self, px, py, chunkSize):
+        radius = self.smoothingRadius
+        kernel = self.addDensity[:2*radius, :2*radius]
+        ky, kx = np.nonzero(kernel)
+        weights = kernel[ky, kx]
+        offsets = (ky - radius)*self.fieldWidth + (kx - radius)
+        flatField = self.field.reshape(-1)
+
+        interior = (px >= radius) & (px <= self.fieldWidth - radius) & (py >= radius) & (py <= self.fieldHeight - radius)
+
+        step = max(1, chunkSize // len(weights))
+        rows = min(step, 1 << max(0, len(px) - 1).bit_length())
+        indexBuffer = self.workspace.buffer("scatterIndex", (rows, len(weights)), np.intp)
+        weightBuffer = self.workspace.buffer("scatterWeights", (rows, len(weights)), weights.dtype, initial=weights)
+
+        #The interior particles go first, then the ones close to the edges
+        for group, edge in ((np.flatnonzero(interior), False), (np.flatnonzero(~interior), True)):
+            for start in range(0, len(group), step):
+                chunk = group[start:start+step]
+                index = indexBuffer[:len(chunk)]
+                np.add((py[chunk]*self.fieldWidth + px[chunk])[:, None], offsets, out=index)
+                chunkWeights = weightBuffer[:len(chunk)]
+
+                if edge:
+                    kernelRows = py[chunk, None] - radius + ky
+                    kernelCols = px[chunk, None] - radius + kx
+                    valid = (kernelRows >= 0) & (kernelRows < self.fieldHeight) & (kernelCols >= 0) & (kernelCols < self.fieldWidth)
+                    index, chunkWeights = index[valid], chunkWeights[valid]
+
+                np.add.at(flatField, index.reshape(-1), chunkWeights.reshape(-1))
+
+    #Method to build the field by convolving the number of particles on each pixel with the kernel
+    def convolveDensity(self, px, py):
+        radius = self.smoothingRadius
+        #The transforms are done as float64 whatever the dtype of the field, numpy would do them at the precision of a
+        #float32 kernel
+        kernel = self.addDensity[:2*radius, :2*radius].astype(np.float64)
+
+        #The transform of the kernel is the same every frame, so it is only done once
+        countHeight = self.fieldHeight + 2*radius
+        countWidth = self.fieldWidth + 2*radius
+        shape = (countHeight + 2*radius - 1, countWidth + 2*radius - 1)
+        kernelSpectrum = self.workspace.buffer("kernelSpectrum", (shape[0], shape[1]//2 + 1), complex,
+                                               lambda: np.fft.rfft2(kernel, shape))
+
+        #Counting the particles at the top left corner of their kernel, on a grid padded by a radius on each side and
+        #with 0s up to the size of the transforms
+        counts = self.workspace.buffer("counts", shape)
+        counts.fill(0)
+        np.add.at(counts.reshape(-1), (py + radius)*shape[1] + (px + radius), 1)
+        full = fftConvolve(counts, kernelSpectrum, self.workspace, "convolve")
+
+        self.field += full[2*radius:2*radius + self.fieldHeight, 2*radius:2*radius + self.fieldWidth]
+
+    def normalizeField(self):
+        for rows, cols in self.regions():
+            self.field[rows, cols] /= 5
+        
+    #Method to clear the field by setting it all back to zeros in place, with tiles only the ones that were active
+    def clearField(self):
+        for rows, cols in self.regions():
+            self.field[rows, cols].fill(0)
+
+    #Method to get the sum of the field in the box of (2*smoothingRadius)**2 cells around every position in pixels.
+    #"window" sums the box of every position with windowSums, "table" builds a summed-area table of the field once and
+    #reads the 4 corners of every box from it, which costs the same for any radius and number of positions
+    def sampleBoxSums(self, positions):
+        radius = self.smoothingRadius
+        method = self.boxSampling(len(positions))
+
+        if method == "table":
+            table = boxSumTable(self.field, self.workspace)
+            return sampleCells(lambda px, py: boxSums(table, px, py, radius), positions, self.cellSize)
+
+        boxKernel = self.workspace.buffer("boxKernel", (2*radius, 2*radius), initial=1)
+        return sampleWindowSums(self.field, boxKernel, positions, radius, self.cellSize, self.workspace)
+
+    #Method to get how sampleBoxSums samples the field for count positions
+    def boxSampling(self, count):
+        corners = 1 if self.cellSize == 1 else 4
+        return samplingMethod(self.sampling, count * corners * (2*self.smoothingRadius)**2, 4 * self.field.size)
+
+    #Method to draw the field around each particle, scaled to 0-255 in an image buffer of the workspace. With tiles only
+    #the active tiles are drawn, the rest of the image would be black anyway
+    def drawDensityField(self, background):
+        regions = self.regions()
+        image = self.workspace.buffer("image", self.field.T.shape, imageDtype(self.field.dtype))
+        peak = self.field.max() if self.tiles is None else regionsMax(self.field, regions, self.tiles.active.all())
+        for rows, cols in regions:
+            np.divide(self.field[rows, cols].T, peak, out=image[cols, rows])
+            np.multiply(image[cols, rows], 255, out=image[cols, rows])
+        drawFieldImage(image, self.cellSize, background, self.workspace, None if self.tiles is None else regions)
+        
+#Class for the velocity vector field to affect motion of the particles
+class vectorField():
+
+    #x and y dirrection of each of the 4 shifted density planes (left, right, down, up). Every vector of the field is
+    #one of these scaled by the density, so both modes look them up here instead of keeping them for every cell
+    xDirections = np.array([-1.0, 1.0, 0.0, 0.0])
+    yDirections = np.array([0.0, 0.0, 1.0, -1.0])
+
+    #Initialize the vector field that has the attributes of the window width and height,
+    #and the radius of the vector field itself. The mode chooses how the dirrection of each vector is found,
+    #"argsort" sorts the 4 shifted density planes and "fast" finds the largest one in preallocated buffers
+    #Like the density field, the vector field can have cells of cellSize by cellSize pixels and its radius is in cells,
+    #and it is stored as dtype
+    def __init__(self, width, height, radius, mode="fast", cellSize=1, dtype=np.float64):
+        self.cellSize = cellSize
+        self.vectorWidth = gridSize(width, cellSize)
+        self.vectorHeight = gridSize(height, cellSize)
+        width, height = self.vectorWidth, self.vectorHeight
+        self.field = np.zeros((height, width, 2), dtype)
+        #Buffers reused every frame for sampling and drawing the field
+        self.workspace = frameWorkspace()
+        self.setRadius(radius)
+
+        if mode not in ("argsort", "fast"):
+            raise ValueError("Unknown vector field mode: " + str(mode))
+        self.mode = mode
+
+        #Buffers for the fast mode, the largest neighbouring density found so far, which dirrection it is in and
+        #where a new dirrection is at least as dense. The dirrections are kept as np.uint8, a byte per cell, and turned
+        #into x and y with directionComponent instead of np.take, which would copy them into np.intp first
+        self.bestDensity = np.zeros((height, width), dtype)
+        self.direction = np.zeros((height, width), dtype=np.uint8)
+        self.directionMask = np.zeros((height, width), dtype=bool)
+
+        #tileMap of the density field the vectors are built from, None when the whole field is always built and drawn,
+        #and which tiles can still hold vectors from an earlier frame or from the mouse
+        self.tiles = None
+        self.stale = None
+        #How sampleSums sums the vectors around the particles, "window", "table" or "auto"
+        self.sampling = "auto"
+
+    #Method to only build and draw the vectors on the active tiles of the density field's tileMap, in the fast mode.
+    #The vectors are the dirrections scaled by the density, so they are 0 wherever the density is
+    def useTiles(self, tiles):
+        self.tiles = tiles
+        self.stale = np.zeros_like(tiles.active)
+        self.field.fill(0)
+
+    #Method to mark the cells rows (a slice) and cols as changed outside of updateVectorField, like the mouse does, so
+    #they are cleared again and drawn even when they are not on an active tile
+    def markChanged(self, rows, cols):
+        if self.tiles is not None:
+            self.stale |= self.tiles.tilesOf(rows, cols)
+
+    #Method to change the radius of the vector field, given in pixels. The matrix the vectors are weighed with holds 1 at
+    #the center and decreases further away from it, down to 0 outside of the radius, the same as the smoothing kernel
+    def setRadius(self, radius):
+        self.radius = max(1, round(radius / self.cellSize))
+        self.distanceMultiplier = FluidSimKernels.stencil("smoothing", self.radius, self.field.dtype)
+        self.workspace.clear()
+    
+    #Method to calculate the dirrection each vector of the grid should go in with the selected mode
+    def updateVectorField(self, dField):
+        if self.mode == "fast" and self.tiles is not None:
+            self.updateVectorFieldTiles(dField)
+        elif self.mode == "fast":
+            self.updateVectorFieldFast(dField)
+        else:
+            self.updateVectorFieldArgsort(dField)
+
+    #Method to do the same as updateVectorFieldFast on the active tiles only. The tiles that held vectors before and
+    #are not active anymore are set back to 0, and every region of active tiles finds its dirrections from the
+    #density field around it, which gives each vector the same value as building the whole field
+    def updateVectorFieldTiles(self, dField):
+        for rows, cols in self.tiles.regions(self.stale & ~self.tiles.active):
+            self.field[rows, cols] = 0
+
+        for rows, cols in self.tiles.regions():
+            self.fastRegion(dField, rows, cols)
+        self.stale = self.tiles.active.copy()
+
+    #Method to find the dirrections of the vectors in the cells rows, cols (slices) the same way updateVectorFieldFast
+    #does for the whole field, reading the neighbours just outside of the region from the density field and using 1
+    #for the neighbours past the edges of the field
+    def fastRegion(self, dField, rows, cols):
+        height, width = dField.shape
+        best = self.bestDensity[rows, cols]
+        direction = self.direction[rows, cols]
+        direction.fill(0)
+
+        #Left, right, down and up neighbours. The neighbour of a cell is offset by (dy, dx), and the cells of the region
+        #whose neighbour is past the edge of the field are split off and compared against 1
+        for index, (dy, dx) in enumerate([(0, 1), (0, -1), (-1, 0), (1, 0)]):
+            inner = (slice(max(rows.start, -dy), min(rows.stop, height - dy)), slice(max(cols.start, -dx), min(cols.stop, width - dx)))
+            local = (slice(inner[0].start - rows.start, inner[0].stop - rows.start), slice(inner[1].start - cols.start, inner[1].stop - cols.start))
+            candidate = dField[inner[0].start + dy:inner[0].stop + dy, inner[1].start + dx:inner[1].stop + dx]
+
+            #The edge is the row or column of the region that is left over, if the region touches that edge
+            edge = None
+            if dy != 0 and local[0] != slice(0, best.shape[0]):
+                edge = (slice(0, 1), slice(None)) if dy < 0 else (slice(best.shape[0] - 1, None), slice(None))
+            if dx != 0 and local[1] != slice(0, best.shape[1]):
+                edge = (slice(None), slice(0, 1)) if dx < 0 else (slice(None), slice(best.shape[1] - 1, None))
+
+            if index == 0:
+                best[local] = candidate
+                if edge is not None:
+                    best[edge] = 1
+                continue
+            self.chooseRegionDirection(best, direction, local, candidate, index)
+            if edge is not None:
+                self.chooseRegionDirection(best, direction, edge, 1, index)
+
+        component = self.workspace.buffer("component", self.direction.shape, self.field.dtype)[rows, cols]
+        mask = self.directionMask[rows, cols]
+        self.directionComponent(vectorField.xDirections, direction, mask, component)
+        np.multiply(component, dField[rows, cols], out=self.field[rows, cols, 0])
+        self.directionComponent(vectorField.yDirections, direction, mask, component)
+        np.multiply(component, dField[rows, cols], out=self.field[rows, cols, 1])
+
+    #Method to do the same as chooseDirection on the buffers of a region, in a part of it
+    def chooseRegionDirection(self, best, direction, part, candidate, index):
+        mask = self.directionMask[:best.shape[0], :best.shape[1]][part]
+        best = best[part]
+
+        np.greater_equal(candidate, best, out=mask)
+        np.copyto(best, candidate, where=mask)
+        np.copyto(direction[part], index, where=mask)
+
+    #Method to shift density fields in order to calculate the dirrection each vector of the grid should go in
+    def updateVectorFieldArgsort(self, dField):
+        #By creating 4 new arrays/planes that are shifted on pixel up, left, down, and right, it is less intensive to read all the surrounding density values
+        #of a point on the map to find out which way the velocity vector should go
+
+        #Creating shiften arrays in all 4 cardinal directions of the density field to then sort them. The edges of the field
+        #are replaced with 1s (highest value) to encourage vector to go away from the edges
+        densityLEFT = np.hstack((dField[:,1:], np.ones((self.vectorHeight,1))))
+        densityRIGHT = np.hstack((np.ones((self.vectorHeight,1)), dField[:,:-1]))
+        densityDOWN = np.vstack((np.ones((1,self.vectorWidth)), dField[:-1,:]))
+        densityUP = np.vstack((dField[1:,:], np.ones((1,self.vectorWidth))))
+
+        #Creating a 3D matrix out of the shifted matrices
+        densityStack = np.stack([densityLEFT, densityRIGHT, densityDOWN, densityUP], axis=2)
+        #Creating a sorting index matrix to then take_along_axis only the values of direction that point away from
+        #the highest density value in the densityStack
+        densityPicks = np.argsort(densityStack, axis=2)
+
+        #Looking up the x and y dirrections of the planes picked by the sorting matrix created by the preveius two lines.
+        #Taking the 4th index along the 3rd axis because it corresponds to what the heighest density values where in the
+        #3D density stack
+        xVectors = vectorField.xDirections[densityPicks[:,:,3]]
+        #Same for y
+        yVectors = vectorField.yDirections[densityPicks[:,:,3]]
+
+        #Multiplying the dirrection x and y matrixes by the density field to scale their strength, which fills the two
+        #x and y velocities of the 3D Matrix representing the velocity vector field
+        self.field[:, :, 0] = xVectors * dField
+        self.field[:, :, 1] = yVectors * dField
+
+    #Method to find the same dirrections as updateVectorFieldArgsort without building the shifted copies or sorting them.
+    #The neighbouring densities are compared one dirrection at a time against the largest one found so far, reading
+    #them through shifted views of the density field and using 1 for the neighbours past the edges. When several
+    #neighbours are equally dense the last dirrection wins, which is what a stable sort would pick (the default
+    #np.argsort is not stable, so the argsort mode can break those ties differently depending on the platform)
+    def updateVectorFieldFast(self, dField):
+        best = self.bestDensity
+        direction = self.direction
+
+        #Starting with the left neighbour of every pixel
+        best[:, :-1] = dField[:, 1:]
+        best[:, -1] = 1
+        direction.fill(0)
+
+        #Right, down and up neighbours, each split into the part read from the field and the edge filled with 1s
+        self.chooseDirection(np.s_[:, 1:], dField[:, :-1], 1)
+        self.chooseDirection(np.s_[:, :1], 1, 1)
+        self.chooseDirection(np.s_[1:, :], dField[:-1, :], 2)
+        self.chooseDirection(np.s_[:1, :], 1, 2)
+        self.chooseDirection(np.s_[:-1, :], dField[1:, :], 3)
+        self.chooseDirection(np.s_[-1:, :], 1, 3)
+
+        #Looking up the x and y dirrection of the chosen neighbour and scaling it by the density field
+        #Each dirrection is looked up into a contiguous buffer first, and only then written into the strided field
+        component = self.workspace.buffer("component", direction.shape, self.field.dtype)
+        self.directionComponent(vectorField.xDirections, direction, self.directionMask, component)
+        np.multiply(component, dField, out=self.field[:, :, 0])
+        self.directionComponent(vectorField.yDirections, direction, self.directionMask, component)
+        np.multiply(component, dField, out=self.field[:, :, 1])
+
+    #Method to write the component of directions (xDirections or yDirections) of the chosen dirrection of every cell into
+    #component, as 1 where it is the dirrection pointing up that axis minus 1 where it is the one pointing down it. This
+    #gives the same -1, 0 and 1 as looking them up, using mask as a buffer
+    def directionComponent(self, directions, direction, mask, component):
+        np.equal(direction, np.argmax(directions), out=mask)
+        np.copyto(component, mask)
+        np.equal(direction, np.argmin(directions), out=mask)
+        np.subtract(component, mask, out=component)
+
+    #Method to replace the chosen dirrection in a region of the grid wherever the candidate density is at least as large
+    def chooseDirection(self, region, candidate, index):
+        mask = self.directionMask[region]
+        best = self.bestDensity[region]
+
+        np.greater_equal(candidate, best, out=mask)
+        np.copyto(best, candidate, where=mask)
+        np.copyto(self.direction[region], index, where=mask)
+
+    #Method to get the sum of the vectors around every position in pixels weighed by distanceMultiplier, the push of
+    #the field on a particle there. "window" sums the window of every position with windowSums, "table" correlates the
+    #whole field with distanceMultiplier once with FFTs and looks every position up in it, which costs the same for
+    #any radius and number of positions
+    def sampleSums(self, positions):
+        method = self.sumSampling(len(positions))
+
+        if method == "table":
+            table = windowSumTable(self.field, self.distanceMultiplier, self.radius, self.workspace)
+            return sampleCells(lambda px, py: tableSums(table, px, py), positions, self.cellSize)
+
+        return sampleWindowSums(self.field, self.distanceMultiplier, positions, self.radius, self.cellSize, self.workspace)
+
+    #Method to get how sampleSums samples the field for count positions
+    def sumSampling(self, count):
+        corners = 1 if self.cellSize == 1 else 4
+        windowCost = count * corners * (2*self.radius)**2
+        return samplingMethod(self.sampling, windowCost, 6 * self.field[:, :, 0].size)
+
+
+    #Method to draw the vector field around each particle, the more transparent it is the less dense that area is.
+    #The normalized field and the image are built in buffers of the workspace. With tiles only the tiles that hold
+    #vectors are drawn, the rest of the image would be black anyway
+    def drawVectorField(self, background):
+        tiled = self.tiles is not None and self.mode == "fast"
+        if not tiled:
+            regions = [(slice(0, self.vectorHeight), slice(0, self.vectorWidth))]
+            peak = self.field.max()
+        else:
+            regions = self.tiles.regions(self.stale)
+            peak = regionsMax(self.field, regions, self.stale.all())
+
+        normalField = self.workspace.buffer("normalField", self.field.shape, imageDtype(self.field.dtype))
+        image = self.workspace.buffer("image", self.field.shape[1::-1], imageDtype(self.field.dtype))
+        red = self.workspace.buffer("imageRed", self.field.shape[1::-1], imageDtype(self.field.dtype))
+        for rows, cols in regions:
+            #normalizing the field first
+            np.divide(self.field[rows, cols], peak, out=normalField[rows, cols])
+
+            #updating the python pixelarray's color
+            np.multiply(normalField[rows, cols, 1].T, 255, out=image[cols, rows])
+            np.multiply(normalField[rows, cols, 0].T, 255**2, out=red[cols, rows])
+            np.add(image[cols, rows], red[cols, rows], out=image[cols, rows])
+        drawFieldImage(image, self.cellSize, background, self.workspace, regions if tiled else None)
+
+class changeVectorField():
+
+    #Constructor for initializing the velocity vector field. The radius is given in pixels and turned into cells of
+    #the vector field it changes when the field has cells of cellSize pixels
+    def __init__(self, radius, strength, cellSize=1):
+        self.cellSize = cellSize
+        self.strength = strength
+        self.setRadius(radius)
+
+    #Method to change the radius around the mouse that the vector field is changed in, given in pixels. The vectors
+    #added point towards the mouse, or away from it when reversed, and get stronger further away from it
+    def setRadius(self, radius):
+        self.radius = max(1, round(radius / self.cellSize))
+        self.vectorRadiusDensity = FluidSimKernels.mouseStencil(self.radius, self.strength)
+
+    #Method for updating the velocity vector matrix at a specific point of the mouse
+    def updateVectorMatrix(self, px, py, vField, mouseRight):
+        px, py = self.cellOf(px, py)
+
+        xmin, rxmin = (max(0, px-self.radius), max(0, self.radius-px))
+        xmax, rxmax = (min(vField.vectorWidth, px+self.radius), min(2*self.radius, self.radius + vField.vectorWidth-px))
+        ymin, rymin = (max(0, py-self.radius), max(0, self.radius-py))
+        ymax, rymax = (min(vField.vectorHeight, py+self.radius), min(2*self.radius, self.radius + vField.vectorHeight-py))
+
+        reverse = 1
+        if mouseRight:
+            reverse = -1
+        vField.markChanged(slice(ymin, ymax), slice(xmin, xmax))
+        
+        vField.field[ymin:ymax, xmin:xmax, 0] += self.vectorRadiusDensity[rymin:rymax, rxmin:rxmax, 0] * reverse
+        vField.field[ymin:ymax, xmin:xmax, 1] += self.vectorRadiusDensity[rymin:rymax, rxmin:rxmax, 1] * reverse
+
+        return vField
+
+    #Method to get the cell of the vector field a pixel is in
+    def cellOf(self, x, y):
+        if self.cellSize == 1:
+            return x, y
+
+        cell = np.rint(cellCoordinates((x, y), self.cellSize)).astype(int)
+        return int(cell[0]), int(cell[1])
+
+    #Method to find the vectors the mouse adds under each particle at pixel positions px, py, the same values
+    #updateVectorMatrix adds to the vector field at those pixels, for the solvers that do not use the vector field
+    def sampleVectors(self, px, py, mouseX, mouseY, mouseRight):
+        rows = np.rint((py - mouseY) / self.cellSize).astype(np.intp) + self.radius
+        cols = np.rint((px - mouseX) / self.cellSize).astype(np.intp) + self.radius
+        inside = (rows >= 0) & (rows < 2*self.radius) & (cols >= 0) & (cols < 2*self.radius)
+
+        vectors = np.zeros((len(px), 2))
+        vectors[inside] = self.vectorRadiusDensity[rows[inside], cols[inside]]
+
+        return -vectors if mouseRight else vectors
+
+#Class for smoothed particle hydrodynamics (SPH) between the particles themselves instead of through the density and
+#vector fields, so the work depends on how many particles there are and how many neighbours each of them has, not on
+#the size of the scene. The particles are binned into cells as big as the smoothing radius using a spatial hash, so
+#every particle only has to be checked against the particles in the 3x3 cells around it. The density of a particle
+#uses the same smoothingKernel as the density field by default, or any other kernel of FluidSimKernels, and the
+#pressure pushes particles from dense to less dense areas
+class sphSolver():
+
+    #Offsets of the 3x3 neighbouring cells
+    cellOffsets = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    #Cell coordinates are shifted by this much before they are combined into one key so negative cells work too
+    keyShift = 2**20
+
+    #Initializing the solver with the smoothing radius, how strongly the pressure pushes back against being denser than
+    #restDensity, and the viscosity that evens out the velocity of neighbouring particles. Without a rest density
+    #given, the density of a particle inside of the starting block of particles (spacing apart) is used.
+    #The kernel is scaled to be as high at the particle as the smoothing kernel, so the same stiffness and viscosity
+    #work for every kernel
+    def __init__(self, radius, spacing, stiffness=200.0, restDensity=None, viscosity=0.5, kernel="smoothing"):
+        self.kernel, self.kernelSlope = FluidSimKernels.kernelPair(kernel)
+        self.kernelName = kernel
+        self.spacing = spacing
+        self.stiffness = stiffness
+        self.viscosity = viscosity
+        self.setRadius(radius, restDensity)
+
+        self.density = np.zeros(0)
+        self.pairs = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+
+    #Method to change the smoothing radius, with the rest density found again for the new radius unless one is given
+    def setRadius(self, radius, restDensity=None):
+        self.smoothingRadius = radius
+        self.kernelScale = float(smoothingKernel(0.0, radius) / self.kernel(0.0, radius))
+        self.restDensity = restDensity if restDensity is not None else sphSolver.latticeDensity(radius, self.spacing, self.kernelName)
+
+    #Function to get the density of a particle surrounded by a square grid of particles spacing pixels apart, with the
+    #kernel scaled the same way as in the solver
+    def latticeDensity(radius, spacing, kernel="smoothing"):
+        reach = int(radius // spacing)
+        offsets = np.arange(-reach, reach + 1) * spacing
+        distance = np.hypot(offsets[:, None], offsets[None, :])
+        kernel = FluidSimKernels.kernelPair(kernel)[0]
+        scale = smoothingKernel(0.0, radius) / kernel(0.0, radius)
+
+        return float(np.sum(kernel(distance, radius)) * scale)
+
+    #Method to find every pair of particles closer than the smoothing radius, including each particle with itself.
+    #The cell key of every particle is sorted once, then for each of the 9 neighbouring cells the range of sorted
+    #particles in that cell is found with a binary search and expanded into pairs
+    def findPairs(self, positions):
+        amnt = len(positions)
+        cells = np.floor(positions / self.smoothingRadius).astype(np.int64) + sphSolver.keyShift
+        keys = cells[:, 0] * 2**21 + cells[:, 1]
+
+        order = np.argsort(keys, kind="stable")
+        sortedKeys = keys[order]
+
+        first = []
+        second = []
+        for dx, dy in sphSolver.cellOffsets:
+            neighbourKeys = keys + dx * 2**21 + dy
+            start = np.searchsorted(sortedKeys, neighbourKeys, "left")
+            counts = np.searchsorted(sortedKeys, neighbourKeys, "right") - start
+
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            first.append(np.repeat(np.arange(amnt), counts))
+            second.append(order[np.repeat(start, counts) + within])
+
+        if not first:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+
+        offset = positions[first] - positions[second]
+        close = np.einsum("ij,ij->i", offset, offset) <= self.smoothingRadius**2
+
+        return first[close], second[close]
+
+    #Method to calculate the density of every particle by adding up the kernel of every particle close to it
+    def updateDensity(self, positions):
+        self.pairs = self.findPairs(positions)
+        first, second = self.pairs
+
+        distance = np.linalg.norm(positions[first] - positions[second], axis=1)
+        weights = self.kernelScale * self.kernel(distance, self.smoothingRadius)
+        self.density = np.bincount(first, weights, minlength=len(positions))
+
+        return self.density
+
+    #Method to calculate the acceleration of every particle from the pressure of its neighbours, and from the
+    #viscosity when useViscosity is true, using the pairs and densities found by updateDensity
+    def acceleration(self, positions, velocities, useViscosity=True):
+        first, second = self.pairs
+        different = first != second
+        first, second = first[different], second[different]
+
+        offset = positions[first] - positions[second]
+        distance = np.linalg.norm(offset, axis=1)
+        apart = distance > 0
+        first, second, offset, distance = first[apart], second[apart], offset[apart], distance[apart]
+
+        pressure = self.stiffness * (self.density - self.restDensity)
+        sharedPressure = (pressure[first] + pressure[second]) / (2 * self.density[second])
+        push = -sharedPressure * self.kernelScale * self.kernelSlope(distance, self.smoothingRadius) / distance
+        pairAcceleration = push[:, None] * offset
+
+        if useViscosity:
+            weight = self.viscosity * self.kernelScale * self.kernel(distance, self.smoothingRadius) / self.density[second]
+            pairAcceleration += weight[:, None] * (velocities[second] - velocities[first])
+
+        amnt = len(positions)
+        return np.column_stack((np.bincount(first, pairAcceleration[:, 0], minlength=amnt),
+                                np.bincount(first, pairAcceleration[:, 1], minlength=amnt)))
+
+#Function to get the positions of amnt particles at the beggining of the program, rows of round(amnt**0.5) particles
+#2*radius+1 pixels apart in a block around the middle of the background
+def gridLayout(amnt, radius, background):
+    spacing = radius*2 + 1
+    side = round(amnt**0.5)
+    startX = round(background.width/2 - (side*spacing)/2 + radius)
+    startY = round(background.height/2 - (side*spacing)/2 + radius)
+
+    #A row ends once the next particle would be past the right side of the block
+    columns = startX + np.arange(side + 2)*spacing
+    perRow = max(1, np.count_nonzero(columns <= background.width/2 + (side*spacing)/2))
+
+    index = np.arange(amnt)
+    return np.column_stack((startX + index % perRow * spacing, startY + index // perRow * spacing)).astype(float)
+
+#Function to make all the particles at the beggining of the program as particle objects, at the positions of gridLayout
+def makeParticles(amnt, radius, color, background):
+    return [particle(radius, int(x), int(y), color) for x, y in gridLayout(amnt, radius, background)]
+
+#Function to get the positions of amnt particles packed into a disc around x, y, the points of a grid 2*radius+1
+#pixels apart that are closest to the middle, in rows from the top
+def discLayout(amnt, radius, x, y):
+    spacing = radius*2 + 1
+    reach = int(np.ceil((amnt / np.pi)**0.5)) + 1
+    offsets = np.arange(-reach, reach + 1) * spacing
+    gridX, gridY = np.meshgrid(offsets, offsets)
+    gridX, gridY = gridX.reshape(-1), gridY.reshape(-1)
+
+    closest = np.sort(np.argsort(gridX**2 + gridY**2, kind="stable")[:amnt])
+    return np.column_stack((x + gridX[closest], y + gridY[closest])).astype(float)
+
+#Function to get the positions of amnt particles at random in the box with its top left corner at x, y
+def randomBoxLayout(amnt, x, y, width, height):
+    return np.array([x, y]) + np.random.uniform(0, 1, (amnt, 2)) * np.array([width, height])
+
+#Function to make the particle system at the beggining of the program. The "grid" layout is the one of gridLayout,
+#"disc" packs them into a disc in the middle and "random" spreads them over the whole background. capacity is how many
+#particles the pool has room for before it has to grow
+def makeParticleSystem(amnt, radius, color, background, layout="grid", capacity=None):
+    if layout == "grid":
+        positions = gridLayout(amnt, radius, background)
+    elif layout == "disc":
+        positions = discLayout(amnt, radius, round(background.width/2), round(background.height/2))
+    elif layout == "random":
+        positions = randomBoxLayout(amnt, radius + 1, radius + 1, background.width - 2*radius - 3, background.height - 2*radius - 3)
+    else:
+        raise ValueError("Unknown particle layout: " + str(layout))
+
+    return particleSystem(radius, positions, color, capacity)
+
+#Class for a source of particles, adding rate particles every few steps at random positions in a box (a point when
+#the box has no size) with a velocity plus normally distributed noise of spread pixels per time step
+class particleEmitter:
+
+    def __init__(self, x, y, rate, velocity=(0, 0), spread=0.0, width=0, height=0, every=1):
+        self.x = x
+        self.y = y
+        self.rate = rate
+        self.velocity = velocity
+        self.spread = spread
+        self.width = width
+        self.height = height
+        self.every = every
+
+    #Method to add the particles of one step to a particleSystem, on the steps that are a multiple of every.
+    #Returns how many particles were added
+    def emit(self, particles, stepCount, radius, color):
+        if stepCount % self.every != 0 or self.rate == 0:
+            return 0
+
+        positions = randomBoxLayout(self.rate, self.x, self.y, self.width, self.height)
+        velocities = np.array(self.velocity, dtype=float) + self.spread*np.random.standard_normal((self.rate, 2))
+        particles.spawn(positions, velocities, color, radius)
+
+        return self.rate
+
+#Class for a box of the scene that removes every particle that ends up inside of it
+class particleSink:
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    #Method to get which of an (N, 2) array of positions are inside of the box
+    def contains(self, positions):
+        x, y = positions[:, 0], positions[:, 1]
+        return (x >= self.x) & (x < self.x + self.width) & (y >= self.y) & (y < self.y + self.height)
+
+#Function to time how long each vector field mode takes per frame, on the density field of the starting block of particles
+#spread over a scene of the given size. Run with: python FluidSim_SabaterAlvoGomez.py --benchmark-vfield [width height]
+def benchmarkVectorField(width=500, height=500, amnt=500, smoothingR=20, frames=50):
+    scene = types.SimpleNamespace(width=width, height=height)
+    particles = makeParticleSystem(amnt, 4, (0, 163, 108), scene)
+
+    dField = densityField(width, height, smoothingR)
+    dField.updateFieldBulk(particles.position)
+    dField.normalizeField()
+
+    times = {}
+    fields = {}
+    for mode in ("argsort", "fast"):
+        vField = vectorField(width, height, 12, mode)
+        vField.updateVectorField(dField.field)
+
+        start = time.perf_counter()
+        for i in range(frames):
+            vField.updateVectorField(dField.field)
+        times[mode] = (time.perf_counter() - start) / frames
+        fields[mode] = vField.field.copy()
+
+    matching = np.mean(np.all(fields["argsort"] == fields["fast"], axis=2))
+    print("Vector field " + str(width) + "x" + str(height) + ", " + str(frames) + " frames")
+    for mode in times:
+        print("  " + mode.ljust(8) + str(round(times[mode]*1000, 3)) + " ms/frame")
+    print("  speedup " + str(round(times["argsort"]/times["fast"], 2)) + "x, " + str(round(100*matching, 3)) + "% of vectors identical")
+
+    return times
+
+#Class for the whole simulation without anything to do with drawing it. It owns the particles, the density field, the
+#vector field and the mouse's changeVectorField, and steps them forward the same way the main loop of the program used to.
+#It also holds the width and height of the scene, so it is used as the background the particles bounce off of.
+#The particles start out in a layout of makeParticleSystem, and emitters and sinks can add and remove them as it runs
+class Simulation:
+
+    #Initializing the simulation with the size of the scene, the particles and all of the constants of the model
+    def __init__(self, width=500, height=500, particleCount=500, particleR=4, particleColor=(0, 163, 108),
+                 g=9.81*7, dampingcoeff=0.7, densityVal=5, timeStep=0.01, smoothingR=20, vectorRadiusMultiplier=12,
+                 clickRadius=100, clickStrength=0.25, vectorMode="fast", solver="field", cellSize=1, backend="auto",
+                 sphKernel="smoothing", layout="grid", capacity=None, tileSize=None, fieldDtype="float64", sampling="auto"):
+        self.width = width
+        self.height = height
+        self.particleR = particleR
+        self.particleColor = particleColor
+        self.g = g
+        self.dampingcoeff = dampingcoeff
+        self.densityVal = densityVal
+        self.timeStep = timeStep
+
+        #Whether the hot loops run as compiled numba loops or as numpy, "auto" uses numba when it is installed. numba
+        #cannot compile loops over float16 fields, so those always use numpy
+        self.backend = FluidSimJit.selectBackend(backend)
+        if np.dtype(fieldDtype) == np.float16 and self.backend == "numba":
+            if backend == "numba":
+                raise ValueError("The numba backend does not support float16 fields, use float32 or backend='numpy'")
+            self.backend = "numpy"
+
+        self.particles = makeParticleSystem(particleCount, particleR, particleColor, self, layout, capacity)
+
+        #Which solver moves the particles, "field" goes through the density and vector fields covering the whole scene
+        #and "sph" uses the forces between neighbouring particles, spread with the kernel of FluidSimKernels named sphKernel
+        if solver not in ("field", "sph"):
+            raise ValueError("Unknown solver: " + str(solver))
+        self.solver = solver
+        self.sph = sphSolver(smoothingR, 2*particleR + 1, kernel=sphKernel) if solver == "sph" else None
+
+        #The fields have a cell for every cellSize by cellSize pixels of the scene, and are stored as fieldDtype. The sph
+        #solver never builds them and only uses their radii (for the mouse and the substeps), so for it they cover a
+        #single pixel and take up the same memory for any size of scene
+        self.cellSize = cellSize
+        fieldWidth, fieldHeight = (width, height) if solver == "field" else (1, 1)
+        self.dField = densityField(fieldWidth, fieldHeight, smoothingR, cellSize, fieldDtype)
+        self.vField = vectorField(fieldWidth, fieldHeight, vectorRadiusMultiplier, vectorMode, cellSize, fieldDtype)
+        self.clickMouse = changeVectorField(clickRadius, clickStrength, cellSize)
+        #How the fields are summed around the particles, "window" sums around every particle, "table" builds a table of
+        #the sums at every cell of the fields once a substep and looks the particles up in it, "auto" picks the cheaper
+        self.dField.sampling = sampling
+        self.vField.sampling = sampling
+        #With a tileSize the fields are only built and drawn on the tiles of that many cells the particles reach
+        if tileSize and solver == "field":
+            self.dField.useTiles(tileSize)
+            self.vField.useTiles(self.dField.tiles)
+
+        #Conditions for which forces are used, these can be switched while the simulation runs
+        self.useGravity = True
+        self.useRandom = False
+        self.useDecel = True
+        self.colorByVelocity = True
+        self.addMore = False
+        self.moreDelay = 0
+        #particleEmitters that add particles and particleSinks that remove them on every step
+        self.emitters = []
+        self.sinks = []
+
+        #Position of the mouse and which button is pressed, None when the mouse is not changing the vector field
+        self.mouse = None
+        self.stepCount = 0
+
+        #Every step of timeStep is split into substeps of the same length. With adaptiveSubsteps more substeps (up to
+        #maxSubsteps) are used when the fastest particle would move more than cfl times the particle radius or the
+        #smoothing radius, whichever is smaller, in one substep
+        self.substeps = 1
+        self.adaptiveSubsteps = False
+        self.maxSubsteps = 16
+        self.cfl = 0.5
+        self.lastSubsteps = 1
+
+        #phaseProfiler the phases of every substep are timed with, None when nothing is profiled
+        self.profiler = None
+
+    #Method to start pushing (mouseRight) or pulling the particles around a point of the scene with the mouse
+    def setMouse(self, x, y, mouseRight):
+        self.mouse = (round(x), round(y), mouseRight)
+
+    #Method to stop changing the vector field with the mouse
+    def releaseMouse(self):
+        self.mouse = None
+
+    #Method to change the smoothing radius in pixels while the simulation runs, for the density field and the sph solver
+    def setSmoothingRadius(self, radius):
+        self.dField.setRadius(radius)
+        if self.sph is not None:
+            self.sph.setRadius(radius)
+
+    #Method to change the radius in pixels around the mouse that moves the particles
+    def setClickRadius(self, radius):
+        self.clickMouse.setRadius(radius)
+
+    #Method to set the color of all particles back to the starting color
+    def resetColor(self):
+        self.particles.resetColor(self.particleColor)
+
+    #Method to add a particle in the top left corner every other step while addMore is on
+    def pourParticles(self):
+        if self.moreDelay == 0:
+            self.particles.addParticle(self.particleR, self.particleR+5, self.particleR+5, self.particleColor, vx=3)
+            self.moreDelay = -1
+        self.moreDelay += 1
+
+    #Method to add the particles of every emitter for this step
+    def emitParticles(self):
+        for emitter in self.emitters:
+            emitter.emit(self.particles, self.stepCount, self.particleR, self.particleColor)
+
+    #Method to remove the particles inside of any of the sinks, returns how many were removed
+    def drainParticles(self):
+        if not self.sinks or len(self.particles) == 0:
+            return 0
+
+        remove = np.zeros(len(self.particles), dtype=bool)
+        for sink in self.sinks:
+            remove |= sink.contains(self.particles.position)
+
+        return self.particles.removeParticles(remove)
+
+    #Method to build the density field from the current particle positions, or the density of every particle for sph
+    def updateDensity(self):
+        if self.solver == "sph":
+            self.sph.updateDensity(self.particles.position)
+            return
+
+        self.dField.clearField()
+        self.dField.updateFieldBulk(self.particles.position, "jit" if self.backend == "numba" else "auto")
+        self.dField.normalizeField()
+
+    #Method to build the vector field from the density field, with the mouse's changes on top of it. The sph solver
+    #does not use the vector field
+    def updateVectors(self):
+        if self.solver == "sph":
+            return
+
+        self.vField.updateVectorField(self.dField.field)
+        self.applyMouse()
+
+    #Method to add the mouse's changes to the vector field while a mouse button is pressed
+    def applyMouse(self):
+        if self.mouse is not None:
+            self.clickMouse.updateVectorMatrix(self.mouse[0], self.mouse[1], self.vField, self.mouse[2])
+
+    #Method to build the density field and the vector field from the current particle positions
+    def updateFields(self):
+        self.updateDensity()
+        self.updateVectors()
+
+    #Method to move the particles one time step with the fields, or with the forces between them for sph. dt is the
+    #length of the step, a full timeStep when it is not given
+    def updateParticles(self, dt=None):
+        dt = self.timeStep if dt is None else dt
+        scale = dt / self.timeStep
+        if self.solver == "sph":
+            self.particles.updateVelocitySPH(self.g, self.dampingcoeff, dt, self, self.useGravity, self.useRandom,
+                                             self.useDecel, self.densityVal, self.sph, self.mouseVectors(), scale)
+        elif self.backend == "numba" and self.cellSize == 1:
+            self.particles.updateJit(self.g, self.dampingcoeff, dt, self, self.useGravity, self.useRandom,
+                                     self.useDecel, self.densityVal, self.vField, self.dField, self.colorByVelocity, scale)
+            return
+        else:
+            self.particles.updateVelocity(self.g, self.dampingcoeff, dt, self, self.useGravity, self.useRandom,
+                                          self.useDecel, self.densityVal, self.vField, self.dField, scale)
+        self.particles.updatePosition(self, scale)
+        if self.colorByVelocity:
+            self.particles.updateColor()
+
+    #Method to get the push of the mouse on every particle when the vector field is not used. Each particle gets the
+    #mouse's vector under it times the sum of the vector field's distanceMultiplier (scaled by the pixels in a cell),
+    #which is about what the field solver adds when it sums the mouse's vectors around the particle
+    def mouseVectors(self):
+        if self.mouse is None:
+            return None
+
+        px, py = self.particles.pixelPositions()
+        radius = self.vField.radius
+        vectors = self.clickMouse.sampleVectors(px, py, self.mouse[0], self.mouse[1], self.mouse[2])
+
+        return vectors * np.sum(self.vField.distanceMultiplier[:2*radius, :2*radius]) * self.cellSize**2
+
+    #Method to get how many substeps the next time step is split into. The velocities are in pixels per time step, so
+    #the fastest particle moves its speed divided by the number of substeps in each one
+    def substepCount(self):
+        if not self.adaptiveSubsteps or len(self.particles) == 0:
+            return self.substeps
+
+        smoothingPixels = self.dField.smoothingRadius * self.cellSize
+        limit = self.cfl * min(self.particleR, smoothingPixels)
+        fastest = np.sqrt(np.max(np.einsum("ij,ij->i", self.particles.velocity, self.particles.velocity)))
+
+        return int(min(self.maxSubsteps, max(self.substeps, np.ceil(fastest / limit))))
+
+    #Method to advance the simulation by n time steps, each one split into substeps that rebuild the fields and
+    #move the particles by a part of the time step
+    def step(self, n=1):
+        for i in range(n):
+            if self.addMore:
+                self.pourParticles()
+            self.emitParticles()
+            self.lastSubsteps = self.substepCount()
+            for substep in range(self.lastSubsteps):
+                if self.profiler is None:
+                    self.updateFields()
+                    self.updateParticles(self.timeStep / self.lastSubsteps)
+                else:
+                    self.profiledSubstep(self.timeStep / self.lastSubsteps)
+            self.drainParticles()
+            self.stepCount += 1
+
+    #Method to do the same as a substep of step, timing the density field, the vector field, the mouse and the
+    #particles as separate phases of the profiler
+    def profiledSubstep(self, dt):
+        self.profiler.lap("other")
+        self.updateDensity()
+        self.profiler.lap("density")
+        if self.solver == "field":
+            self.vField.updateVectorField(self.dField.field)
+            self.profiler.lap("vectorField")
+            self.applyMouse()
+            self.profiler.lap("mouse")
+        self.updateParticles(dt)
+        self.profiler.lap("particles")
+
+    #Method to get how many bytes the arrays of the density field, vector field and mouse's vector field take up
+    def fieldMemory(self):
+        fields = [self.dField, self.vField, self.clickMouse]
+        arrays = sum(value.nbytes for field in fields for value in vars(field).values() if isinstance(value, np.ndarray))
+        return arrays + self.dField.workspace.nbytes() + self.vField.workspace.nbytes()
+
+    #Method to get a copy of the state of the simulation that will not change as it keeps stepping. The fields
+    #are only copied when asked for since they are much larger than the particle arrays (for the sph solver they are
+    #the single cell it never builds)
+    def snapshot(self, includeFields=False):
+        state = {
+            "step": self.stepCount,
+            "position": self.particles.position.copy(),
+            "velocity": self.particles.velocity.copy(),
+            "speed": self.particles.speed.copy(),
+            "color": self.particles.color.copy(),
+            "radius": self.particles.radius.copy(),
+        }
+        if includeFields:
+            state["density"] = self.dField.field.copy()
+            state["vectors"] = self.vField.field.copy()
+
+        return state
+
+#Class for keeping the simulation running at a set number of time steps per second of real time, however long drawing
+#a frame takes. Before each frame it says how many steps are due since the last one, so a slow frame is followed by
+#several steps and the frames in between are skipped. When more than maxSteps are due the rest are dropped, so the
+#simulation slows down instead of falling further and further behind
+class frameScheduler:
+
+    def __init__(self, stepsPerSecond, maxSteps=5):
+        self.stepInterval = 1 / stepsPerSecond
+        self.maxSteps = maxSteps
+        self.reset()
+
+    #Method to start counting from now, forgetting any steps that were due
+    def reset(self):
+        self.lastTime = time.perf_counter()
+        self.backlog = 0.0
+        self.skippedFrames = 0
+        self.droppedSteps = 0
+
+    #Method to get how many steps to run before drawing the next frame, waiting until at least one is due
+    def stepsDue(self):
+        now = time.perf_counter()
+        self.backlog += now - self.lastTime
+        if self.backlog < self.stepInterval:
+            time.sleep(self.stepInterval - self.backlog)
+            later = time.perf_counter()
+            self.backlog += later - now
+            now = later
+        self.lastTime = now
+
+        #sleep can wake up a little early, the time still missing is taken out of the next frame
+        steps = max(1, int(self.backlog / self.stepInterval))
+        if steps > self.maxSteps:
+            self.droppedSteps += steps - self.maxSteps
+            steps = self.maxSteps
+            self.backlog = 0.0
+        else:
+            self.backlog -= steps * self.stepInterval
+        self.skippedFrames += steps - 1
+
+        return steps
@@ -0,0 +1,131 @@
+import math
+import numpy as np
+
+#Compiled versions of the hot loops of the fluid simulation, using numba when it is installed. Each function does the
+#same work as the numpy code in FluidSimCore.py, but as one loop that numba compiles and runs over several cores.
+#Without numba the functions are left as plain python so the module can still be imported, and selectBackend makes
+#the simulation use the numpy code instead.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+available = numba is not None
+
+if available:
+    jit = numba.njit(parallel=True, cache=True)
+    prange = numba.prange
+else:
+    def jit(function):
+        return function
+    prange = range
+
+#Function to pick which backend the simulation uses. "auto" uses numba when it is installed and numpy otherwise
+def selectBackend(backend="auto"):
+    if backend == "auto":
+        return "numba" if available else "numpy"
+    if backend not in ("numpy", "numba"):
+        raise ValueError("Unknown backend: " + str(backend))
+    if backend == "numba" and not available:
+        raise ImportError("The numba backend needs numba to be installed, use backend='numpy' or 'auto' instead")
+
+    return backend
+
+#Function to start the threads the compiled loops run on from the thread that calls it. When numba starts them the
+#first time a compiled loop runs on another thread, like the worker thread of FluidSimThreaded, the program can hang
+#when it exits, so the main thread starts them first
+def startThreads():
+    if available:
+        splatDensity(np.zeros((1, 1)), np.zeros((2, 2)), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), 1)
+
+#Function to add the kernel of every particle to the density field at the cells px, py. The particles have to be
+#sorted by py, then every row of the field finds the particles whose kernel reaches it with a binary search and adds
+#their kernel row to it, so the rows can be filled in parallel without two threads adding to the same cell
+@jit
+def splatDensity(field, kernel, px, py, radius):
+    height, width = field.shape
+
+    for y in prange(height):
+        first = np.searchsorted(py, y - radius + 1)
+        last = np.searchsorted(py, y + radius + 1)
+        for i in range(first, last):
+            row = y - py[i] + radius
+            left = px[i] - radius
+            for col in range(max(0, -left), min(2*radius, width - left)):
+                field[y, left + col] += kernel[row, col]
+
+#Function to update the velocity, position and color of every particle in one loop, doing the same as
+#particleSystem.updateVelocity, updatePosition and updateColor for fields with a cell per pixel. The window sums of the
+#vector field and the density field are done inside the loop for each particle, and the random force is drawn
+#beforehand with numpy so a seeded run matches the numpy backend. scale is how many full time steps timeStep is
+@jit
+def stepParticles(position, velocity, speed, color, radius, vField, distanceMultiplier, vectorRadius, dField, smoothingRadius,
+                  randomForce, g, dampingcoeff, timeStep, densityVal, width, height, gtrue, rtrue, dtrue, colorByVelocity, scale):
+    vHeight, vWidth = vField.shape[0], vField.shape[1]
+    dHeight, dWidth = dField.shape
+    boxArea = (2*smoothingRadius + 1)**2
+
+    for i in prange(len(position)):
+        posx = position[i, 0]
+        posy = position[i, 1]
+        vx = velocity[i, 0]
+        vy = velocity[i, 1]
+        r = radius[i]
+        px = int(np.rint(posx))
+        py = int(np.rint(posy))
+
+        if gtrue:
+            vy += g*timeStep
+        if rtrue:
+            vx += 3*timeStep/scale**0.5*randomForce[i, 0]
+            vy += 3*timeStep/scale**0.5*randomForce[i, 1]
+
+        if dtrue:
+            total = 0.0
+            for y in range(max(0, py - smoothingRadius), min(dHeight, py + smoothingRadius)):
+                for x in range(max(0, px - smoothingRadius), min(dWidth, px + smoothingRadius)):
+                    total += dField[y, x]
+            multiplier = 1 - 0.2*total/boxArea
+            if scale != 1:
+                multiplier = math.copysign(abs(multiplier)**scale, multiplier)
+            vx *= multiplier
+            vy *= multiplier
+
+        sumx = 0.0
+        sumy = 0.0
+        for y in range(max(0, py - vectorRadius), min(vHeight, py + vectorRadius)):
+            row = y - py + vectorRadius
+            for x in range(max(0, px - vectorRadius), min(vWidth, px + vectorRadius)):
+                weight = distanceMultiplier[row, x - px + vectorRadius]
+                sumx += vField[y, x, 0]*weight
+                sumy += vField[y, x, 1]*weight
+        vx += sumx*timeStep*densityVal
+        vy += sumy*timeStep*densityVal
+
+        particleSpeed = math.hypot(vx, vy)
+
+        #Bouncing off of the walls, checked with the position before it moves
+        if posx >= width - r - 1 or posx <= r:
+            vx *= -1*dampingcoeff
+        if posy >= height - r - 1 or posy <= r:
+            vy *= -1*dampingcoeff
+
+        #Moving the particle, putting it right against the wall when it would end up past one
+        newx = posx + vx*scale
+        if newx >= r and newx <= width - 1 - r:
+            posx = newx
+        else:
+            posx = r if posx < width/10 else width - r - 1
+        newy = posy + vy*scale
+        if newy >= r and newy <= height - 1 - r:
+            posy = newy
+        else:
+            posy = r if posy < height/10 else height - r - 1
+
+        position[i, 0] = posx
+        position[i, 1] = posy
+        velocity[i, 0] = vx
+        velocity[i, 1] = vy
+        speed[i] = particleSpeed
+        if colorByVelocity:
+            color[i, 0] = int(np.rint(255 * min(1.0, particleSpeed/10)))
@@ -0,0 +1,109 @@
+import functools
+import numpy as np
+
+#Smoothing kernels of the fluid simulation and the stencils built from them. A kernel is a function of the distance
+#to a particle and the radius it reaches, 0 past the radius, with a matching slope function (its derivative with
+#respect to the distance) for the SPH pressure. A stencil is a kernel sampled on the (2*radius+1, 2*radius+1) pixels
+#around a particle, which is what the density field adds for every particle and what the vector field weighs its
+#vectors with. Stencils are built with numpy all at once and kept in an LRU cache by (kernel, radius, dtype), so
+#changing a radius back and forth while the simulation runs does not build them again. The cached stencils are read
+#only since they are shared.
+
+#The kernel the simulation has always used, 1 at the particle and falling to 0 at the radius. It works on single
+#distances and on arrays of them
+def smoothingKernel(distance, radius):
+    return np.where(distance <= radius, (1.0001 - (distance/radius)**3)**6, 0.0)
+
+#Function for the slope of the smoothing kernel with respect to the distance, which is negative inside of the radius
+def smoothingKernelSlope(distance, radius):
+    return np.where(distance <= radius, -18 * distance**2 / radius**3 * (1.0001 - (distance/radius)**3)**5, 0.0)
+
+#Poly6 kernel of Muller et al. normalized for 2D, smooth everywhere but with a slope that goes to 0 at the particle
+def poly6Kernel(distance, radius):
+    inside = np.clip(radius**2 - np.square(distance), 0, None)
+    return 4 / (np.pi * radius**8) * inside**3
+
+def poly6KernelSlope(distance, radius):
+    inside = np.clip(radius**2 - np.square(distance), 0, None)
+    return -24 / (np.pi * radius**8) * distance * inside**2
+
+#Spiky kernel of Muller et al. normalized for 2D, its slope stays steep close to the particle so the pressure keeps
+#particles from clumping together
+def spikyKernel(distance, radius):
+    inside = np.clip(radius - distance, 0, None)
+    return 10 / (np.pi * radius**5) * inside**3
+
+def spikyKernelSlope(distance, radius):
+    inside = np.clip(radius - distance, 0, None)
+    return -30 / (np.pi * radius**5) * inside**2
+
+#Cubic spline kernel of Monaghan normalized for 2D, with the smoothing length h at half of the radius so it reaches
+#0 at the radius
+def cubicSplineKernel(distance, radius):
+    h = radius / 2
+    q = np.asarray(distance) / h
+    sigma = 10 / (7 * np.pi * h**2)
+    near = 1 - 1.5*q**2 + 0.75*q**3
+    far = 0.25 * np.clip(2 - q, 0, None)**3
+    return sigma * np.where(q <= 1, near, far)
+
+def cubicSplineKernelSlope(distance, radius):
+    h = radius / 2
+    q = np.asarray(distance) / h
+    sigma = 10 / (7 * np.pi * h**2)
+    near = -3*q + 2.25*q**2
+    far = -0.75 * np.clip(2 - q, 0, None)**2
+    return sigma / h * np.where(q <= 1, near, far)
+
+#Every kernel by name, as (kernel, slope)
+kernels = {
+    "smoothing": (smoothingKernel, smoothingKernelSlope),
+    "poly6": (poly6Kernel, poly6KernelSlope),
+    "spiky": (spikyKernel, spikyKernelSlope),
+    "cubicSpline": (cubicSplineKernel, cubicSplineKernelSlope),
+}
+
+#Function to get the (kernel, slope) pair of a kernel by name
+def kernelPair(kind):
+    if kind not in kernels:
+        raise ValueError("Unknown kernel: " + str(kind) + ", use one of " + ", ".join(kernels))
+    return kernels[kind]
+
+#Function to get the x and y offsets of every pixel of a stencil from its middle, and their distance to it
+def stencilOffsets(radius):
+    offsets = np.arange(-radius, radius + 1, dtype=float)
+    x, y = np.meshgrid(offsets, offsets)
+    return x, y, np.sqrt(x**2 + y**2)
+
+#Function to get the stencil of a kernel for a radius in pixels, the value of the kernel at every pixel within the
+#radius of the middle and 0 past it
+def stencil(kind, radius, dtype=np.float64):
+    kernelPair(kind)
+    return cachedStencil(kind, int(radius), np.dtype(dtype).str)
+
+@functools.lru_cache(maxsize=64)
+def cachedStencil(kind, radius, dtype):
+    distance = stencilOffsets(radius)[2]
+    values = np.where(distance <= radius, kernels[kind][0](distance, radius), 0.0).astype(dtype)
+    values.flags.writeable = False
+
+    return values
+
+#Function to get the (2*radius+1, 2*radius+1, 2) stencil of vectors the mouse adds to the vector field, pointing
+#towards the middle and getting stronger further away from it and further above or below it
+def mouseStencil(radius, strength, dtype=np.float64):
+    return cachedMouseStencil(int(radius), float(strength), np.dtype(dtype).str)
+
+@functools.lru_cache(maxsize=16)
+def cachedMouseStencil(radius, strength, dtype):
+    x, y, distance = stencilOffsets(radius)
+    falloff = strength * (1 + 2*np.abs(y)/(2*radius)) * (1.0001 - (1.0001 - distance/radius)**21)
+
+    values = np.zeros((2*radius + 1, 2*radius + 1, 2))
+    inside = distance <= radius
+    values[inside, 0] += (-np.sign(x) * falloff)[inside]
+    values[inside, 1] += (-np.sign(y) * falloff)[inside]
+    values = values.astype(dtype)
+    values.flags.writeable = False
+
+    return values
@@ -0,0 +1,301 @@
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from FluidSimCore import densityField, vectorField, changeVectorField, particleSystem, makeParticleSystem
+
+#Parallel version of the field solver of the simulation. The scene is split into horizontal strips of rows, one for
+#every worker process of a pool. The density field, the vector field and the particle arrays live in shared memory, so
+#the workers read and write them directly instead of sending them back and forth. Every step runs in 3 phases, each
+#one a pool.map over the strips so all strips finish a phase before the next one starts:
+#   1. Each worker builds the density of its strip from the particles within a smoothingRadius of it, on a field
+#      reaching two smoothingRadius past the strip (its halo) so the kernels of those particles are never cut off by
+#      it. The particles are added in the same order and the same way as the whole field adds them, so the strips get
+#      exactly the same density as Simulation when the density is scattered.
+#   2. Each worker finds the vectors of its strip, reading one row of density past each edge of the strip.
+#   3. Each worker moves the particles that were in its strip at the start of the step, reading the fields around
+#      them. The particles that move into another strip are picked up by that strip's worker on the next step.
+#The fields always have a cell per pixel and the vectors are always found with the "fast" vectorField mode.
+
+#Arrays every worker process attaches to, and the density and vector fields of the strips it has worked on
+workerState = {}
+
+#Function to split height rows into the given number of strips, as (first row, last row + 1)
+def makeStrips(height, strips):
+    bounds = np.linspace(0, height, strips + 1).round().astype(int)
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(strips) if bounds[i + 1] > bounds[i]]
+
+#Function to make a numpy array on top of a shared memory block
+def sharedArray(memory, shape, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+#Function every worker process runs when it starts, attaching to the shared memory blocks by name
+def attachWorker(layout, settings, seed):
+    workerState["memory"] = []
+    for name, (memoryName, shape, dtype) in layout.items():
+        memory = shared_memory.SharedMemory(name=memoryName)
+        workerState["memory"].append(memory)
+        workerState[name] = sharedArray(memory, shape, dtype)
+
+    workerState["settings"] = settings
+    workerState["strips"] = {}
+    workerState["seed"] = seed
+
+    #The density and vector fields of the whole scene as the particle update reads them, using the shared arrays
+    width, height = settings["width"], settings["height"]
+    dField = densityField(1, 1, settings["smoothingR"])
+    dField.width, dField.height, dField.fieldWidth, dField.fieldHeight = width, height, width, height
+    dField.field = workerState["density"]
+    vField = vectorField(1, 1, settings["vectorRadius"])
+    vField.vectorWidth, vField.vectorHeight = width, height
+    vField.field = workerState["vectors"]
+    workerState["dField"] = dField
+    workerState["vField"] = vField
+
+#Function to get the density and vector field a worker uses for a strip, made the first time it works on it. The
+#density is built over the strip and its halo of 2*smoothingRadius rows, and the vectors over the strip and one row
+#past each edge, both clipped to the scene
+def stripFields(strip):
+    if strip not in workerState["strips"]:
+        settings = workerState["settings"]
+        top, bottom = strip
+        radius = settings["smoothingR"]
+        densityTop, densityBottom = max(0, top - 2*radius), min(settings["height"], bottom + 2*radius)
+        vectorTop, vectorBottom = max(0, top - 1), min(settings["height"], bottom + 1)
+
+        dField = densityField(settings["width"], densityBottom - densityTop, radius)
+        vField = vectorField(settings["width"], vectorBottom - vectorTop, settings["vectorRadius"])
+        workerState["strips"][strip] = (dField, densityTop, vField, vectorTop, vectorBottom)
+
+    return workerState["strips"][strip]
+
+#Function to get the indices of the particles whose rounded y position is in the rows top to bottom - 1. When height
+#is given the rows are clipped to the field first, so the particles past its top or bottom edge are in its first or
+#last row
+def particlesInRows(position, top, bottom, height=None):
+    rows = np.rint(position[:, 1])
+    if height is not None:
+        np.clip(rows, 0, height - 1, out=rows)
+    return np.flatnonzero((rows >= top) & (rows < bottom))
+
+#Phase 1, building the density field of a strip from the particles that reach it, with the method the whole field
+#would use for all of the particles
+def densityStrip(args):
+    strip, method = args
+    top, bottom = strip
+    dField, densityTop = stripFields(strip)[:2]
+    radius = dField.smoothingRadius
+
+    near = particlesInRows(workerState["position"][:workerState["settings"]["count"]], top - radius + 1, bottom + radius)
+    positions = workerState["position"][near] - [0, densityTop]
+
+    dField.clearField()
+    dField.updateFieldBulk(positions, method)
+    dField.normalizeField()
+    workerState["density"][top:bottom] = dField.field[top - densityTop:bottom - densityTop]
+
+#Phase 2, finding the vectors of a strip from the density field around it
+def vectorStrip(strip):
+    top, bottom = strip
+    vField, vectorTop, vectorBottom = stripFields(strip)[2:]
+
+    vField.updateVectorField(workerState["density"][vectorTop:vectorBottom])
+    workerState["vectors"][top:bottom] = vField.field[top - vectorTop:bottom - vectorTop]
+
+#Phase 3, moving the particles of a strip with the fields of the whole scene. The particles are copied into a
+#particleSystem of their own, updated the same way Simulation updates them and copied back. Which particles a strip
+#moves (mine) is decided by the main process before any of them move, the other strips are writing new positions
+#into the shared array while this one works
+def particleStrip(args):
+    strip, step, flags, mine = args
+    settings = workerState["settings"]
+    if len(mine) == 0:
+        return
+
+    #Every strip gets its own random numbers, different on every step
+    np.random.seed((workerState["seed"], strip[0], step))
+    #The fields are sampled the way Simulation would sample them for all of the particles, not just this strip's
+    workerState["dField"].sampling = flags["densitySampling"]
+    workerState["vField"].sampling = flags["vectorSampling"]
+
+    particles = particleSystem(settings["particleR"], workerState["position"][mine], settings["particleColor"])
+    particles.velocity = workerState["velocity"][mine]
+    particles.color = workerState["color"][mine]
+    particles.radius = workerState["radius"][mine]
+
+    scene = parallelScene(settings["width"], settings["height"])
+    particles.updateVelocity(settings["g"], settings["dampingcoeff"], settings["timeStep"], scene, flags["useGravity"],
+                             flags["useRandom"], flags["useDecel"], settings["densityVal"], workerState["vField"], workerState["dField"])
+    particles.updatePosition(scene)
+    if flags["colorByVelocity"]:
+        particles.updateColor()
+
+    workerState["position"][mine] = particles.position
+    workerState["velocity"][mine] = particles.velocity
+    workerState["speed"][mine] = particles.speed
+    workerState["color"][mine] = particles.color
+
+#Class for the size of the scene, the background the particles bounce off of in the workers
+class parallelScene:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+#Class for running the field solver over a pool of worker processes, with the same interface as Simulation for
+#stepping it, moving the mouse and taking snapshots
+class parallelSimulation:
+
+    #Initializing the parallel simulation with the size of the scene, the constants of the model and how many worker
+    #processes (and strips) to use, all of the cores by default
+    def __init__(self, width=500, height=500, particleCount=500, particleR=4, particleColor=(0, 163, 108),
+                 g=9.81*7, dampingcoeff=0.7, densityVal=5, timeStep=0.01, smoothingR=20, vectorRadiusMultiplier=12,
+                 clickRadius=100, clickStrength=0.25, workers=None, seed=0):
+        self.width = width
+        self.height = height
+        self.particleColor = particleColor
+        self.workers = workers or os.cpu_count()
+        self.strips = makeStrips(height, self.workers)
+        self.solver = "field"
+        self.cellSize = 1
+
+        startParticles = makeParticleSystem(particleCount, particleR, particleColor, self)
+        count = len(startParticles)
+
+        #Making the shared memory blocks and the arrays on top of them
+        shapes = {
+            "density": ((height, width), np.float64),
+            "vectors": ((height, width, 2), np.float64),
+            "position": ((count, 2), np.float64),
+            "velocity": ((count, 2), np.float64),
+            "speed": ((count,), np.float64),
+            "color": ((count, 3), startParticles.color.dtype),
+            "radius": ((count,), np.float64),
+        }
+        self.memory = []
+        layout = {}
+        arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            memory = shared_memory.SharedMemory(create=True, size=size)
+            self.memory.append(memory)
+            layout[name] = (memory.name, shape, np.dtype(dtype).str)
+            arrays[name] = sharedArray(memory, shape, dtype)
+            arrays[name][...] = 0
+
+        #The particles, density field and vector field of the main process use the shared arrays too, so they can
+        #be drawn and looked at like the ones of Simulation
+        self.particles = startParticles
+        for name in ["position", "velocity", "speed", "color", "radius"]:
+            arrays[name][...] = getattr(startParticles, name)
+            self.particles.pool[name] = arrays[name]
+
+        self.dField = densityField(1, 1, smoothingR)
+        self.dField.width, self.dField.height, self.dField.fieldWidth, self.dField.fieldHeight = width, height, width, height
+        self.dField.field = arrays["density"]
+        self.vField = vectorField(1, 1, vectorRadiusMultiplier)
+        self.vField.vectorWidth, self.vField.vectorHeight = width, height
+        self.vField.field = arrays["vectors"]
+        self.clickMouse = changeVectorField(clickRadius, clickStrength)
+
+        settings = {
+            "width": width, "height": height, "count": count, "particleR": particleR, "particleColor": particleColor,
+            "g": g, "dampingcoeff": dampingcoeff, "densityVal": densityVal, "timeStep": timeStep,
+            "smoothingR": smoothingR, "vectorRadius": vectorRadiusMultiplier,
+        }
+        #The workers are not forked from this process, which can already be running threads (numba's, the recorder's or
+        #FluidSimThreaded's) and a forked copy of a process with threads can hang
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        self.pool = context.Pool(self.workers, initializer=attachWorker, initargs=(layout, settings, seed))
+
+        self.useGravity = True
+        self.useRandom = False
+        self.useDecel = True
+        self.colorByVelocity = True
+        self.mouse = None
+        self.stepCount = 0
+
+    #Method to start pushing (mouseRight) or pulling the particles around a point of the scene with the mouse
+    def setMouse(self, x, y, mouseRight):
+        self.mouse = (round(x), round(y), mouseRight)
+
+    #Method to stop changing the vector field with the mouse
+    def releaseMouse(self):
+        self.mouse = None
+
+    #Method to set the color of all particles back to the starting color
+    def resetColor(self):
+        self.particles.resetColor(self.particleColor)
+
+    #Phase 1 over all strips
+    def updateDensity(self):
+        method = self.dField.bulkMethod(len(self.particles))
+        self.pool.map(densityStrip, [(strip, method) for strip in self.strips])
+
+    #Phase 2 over all strips, with the mouse's changes added to the shared vector field afterwards
+    def updateVectors(self):
+        self.pool.map(vectorStrip, self.strips)
+        if self.mouse is not None:
+            self.clickMouse.updateVectorMatrix(self.mouse[0], self.mouse[1], self.vField, self.mouse[2])
+
+    #Method to build the density field and the vector field from the current particle positions
+    def updateFields(self):
+        self.updateDensity()
+        self.updateVectors()
+
+    #Phase 3 over all strips. Every particle belongs to the strip its position is in at the start of the step, so a
+    #particle that moves into another strip is moved by that strip on the next step, never twice in one. The particles
+    #past the top or bottom edge belong to the first or last strip, which moves them back inside the walls
+    def updateParticles(self):
+        flags = {"useGravity": self.useGravity, "useRandom": self.useRandom, "useDecel": self.useDecel,
+                 "colorByVelocity": self.colorByVelocity, "densitySampling": self.dField.boxSampling(len(self.particles)),
+                 "vectorSampling": self.vField.sumSampling(len(self.particles))}
+        work = [(strip, self.stepCount, flags, particlesInRows(self.particles.position, *strip, self.height)) for strip in self.strips]
+        self.pool.map(particleStrip, work)
+
+    #Method to advance the simulation by n time steps
+    def step(self, n=1):
+        for i in range(n):
+            self.updateFields()
+            self.updateParticles()
+            self.stepCount += 1
+
+    #Method to get a copy of the state of the simulation, the same as Simulation.snapshot
+    def snapshot(self, includeFields=False):
+        state = {
+            "step": self.stepCount,
+            "position": self.particles.position.copy(),
+            "velocity": self.particles.velocity.copy(),
+            "speed": self.particles.speed.copy(),
+            "color": self.particles.color.copy(),
+            "radius": self.particles.radius.copy(),
+        }
+        if includeFields:
+            state["density"] = self.dField.field.copy()
+            state["vectors"] = self.vField.field.copy()
+
+        return state
+
+    #Method to stop the worker processes and free the shared memory
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+
+        #The arrays on top of the shared memory have to go before it can be closed
+        self.particles = self.dField = self.vField = None
+        for memory in self.memory:
+            memory.close()
+            memory.unlink()
+        self.memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,115 @@
+import collections
+import csv
+import os
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#Profiler for the phases of every frame of the program. The main loop and the Simulation call lap(name) after each
+#phase, which adds the time since the last lap to that phase, and endFrame once the frame is drawn. It keeps the times
+#of the last few frames for the averages shown on screen, and every frame when recording for saving as CSV.
+#When profiling is off nothing calls it at all, the callers check for it first.
+
+#Function to get how many bytes of memory the program is holding in RAM (its resident set size). It is read from
+#/proc on Linux, elsewhere the peak resident size from the resource module is used instead, and 0 is returned when
+#neither is there (on Windows)
+def residentMemory():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+
+    #ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class phaseProfiler:
+
+    def __init__(self, frames=60, recording=False):
+        self.frames = frames
+        self.recording = recording
+        self.phaseTimes = {}
+        self.frameTimes = collections.deque(maxlen=frames)
+        self.particleCount = 0
+        self.fieldBytes = 0
+        self.residentBytes = 0
+        self.rows = []
+        self.current = {}
+        self.frameStart = self.lastMark = time.perf_counter()
+
+    #Method to start timing a new frame
+    def startFrame(self):
+        self.current = {}
+        self.frameStart = self.lastMark = time.perf_counter()
+
+    #Method to add the time since the last lap (or the start of the frame) to a phase
+    def lap(self, name):
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + now - self.lastMark
+        self.lastMark = now
+
+    #Method to finish the frame, with how many particles there are and how many bytes the fields take up. The resident
+    #memory of the whole program is read here too
+    def endFrame(self, particleCount, fieldBytes):
+        frameTime = time.perf_counter() - self.frameStart
+        self.frameTimes.append(frameTime)
+        self.particleCount = particleCount
+        self.fieldBytes = fieldBytes
+        self.residentBytes = residentMemory()
+
+        #Phases seen for the first time start with zeros for the frames before, so every phase has a time for the
+        #same frames
+        for name in self.current:
+            if name not in self.phaseTimes:
+                self.phaseTimes[name] = collections.deque([0.0]*(len(self.frameTimes) - 1), maxlen=self.frames)
+        for name, times in self.phaseTimes.items():
+            times.append(self.current.get(name, 0.0))
+
+        if self.recording:
+            row = {"frame": len(self.rows), "frameMs": 1000*frameTime, "particles": particleCount,
+                   "fieldMB": fieldBytes / 2**20, "residentMB": self.residentBytes / 2**20}
+            for name, seconds in self.current.items():
+                row[name + "Ms"] = 1000*seconds
+            self.rows.append(row)
+
+    #Method to get the mean time of every phase over the last frames in ms
+    def averages(self):
+        return {name: 1000*sum(times)/len(times) for name, times in self.phaseTimes.items() if len(times) > 0}
+
+    #Method to get the frames per second over the last frames
+    def fps(self):
+        if len(self.frameTimes) == 0:
+            return 0.0
+        return len(self.frameTimes) / sum(self.frameTimes)
+
+    #Method to get the lines of text shown on screen
+    def summary(self):
+        meanFrame = 1000*sum(self.frameTimes)/len(self.frameTimes) if len(self.frameTimes) > 0 else 0.0
+        lines = [
+            "fps " + str(round(self.fps(), 1)) + "  frame " + str(round(meanFrame, 2)) + "ms",
+            "particles " + str(self.particleCount) + "  fields " + str(round(self.fieldBytes / 2**20, 1)) + "MB" +
+            "  resident " + str(round(self.residentBytes / 2**20, 1)) + "MB",
+        ]
+        for name, ms in self.averages().items():
+            lines.append(name + " " + str(round(ms, 2)) + "ms")
+
+        return lines
+
+    #Method to save every recorded frame as a row of a CSV file, with a column for every phase in ms
+    def writeCsv(self, path):
+        columns = ["frame", "frameMs", "particles", "fieldMB", "residentMB"]
+        for row in self.rows:
+            for name in row:
+                if name not in columns:
+                    columns.append(name)
+
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, columns, restval=0.0)
+            writer.writeheader()
+            writer.writerows(self.rows)
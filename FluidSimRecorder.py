@@ -0,0 +1,225 @@
+import json
+import queue
+import threading
+import warnings
+
+import numpy as np
+
+from FluidSimCore import particleSystem
+
+#Recording of a simulation run into one file, for looking at a run again without running the physics and for starting
+#a simulation again from any recorded frame. The file starts with a small header and then holds fixed size float32
+#arrays for every frame, opened with np.memmap so only the frames that are used are read from the disk:
+#   header       "FLUIDREC" then the length of a JSON text with the size of the arrays and the simulation's constants
+#   frameInfo    (frames, 2) int64, the step number and how many particles the frame has, -1 until it is written
+#   position     (frames, maxParticles, 2) float32
+#   velocity     (frames, maxParticles, 2) float32
+#   color        (frames, maxParticles, 3) uint8
+#   density      (densityFrames, rows, cols) float32, optional, the density field every densityEvery frames with only
+#                every densityStride-th row and column kept
+#The arrays are written by a background thread, so recording a frame only costs the copy of the particle arrays.
+#
+#Example:
+#   with trajectoryRecorder("run.rec", sim, frames=1000) as recorder:
+#       for i in range(1000):
+#           sim.step()
+#           recorder.record(sim)
+#   reader = trajectoryReader("run.rec")
+#   reader.restore(sim, 500)
+
+magic = b"FLUIDREC"
+headerSize = 4096
+
+#Function to get the shape, dtype and byte offset of every array in the file from its header
+def fileLayout(header):
+    frames, maxParticles = header["frames"], header["maxParticles"]
+    arrays = [
+        ("frameInfo", (frames, 2), np.int64),
+        ("position", (frames, maxParticles, 2), np.float32),
+        ("velocity", (frames, maxParticles, 2), np.float32),
+        ("color", (frames, maxParticles, 3), np.uint8),
+    ]
+    if header["densityStride"] > 0:
+        arrays.append(("density", (header["densityFrames"],) + tuple(header["densityShape"]), np.float32))
+
+    layout = {}
+    offset = headerSize
+    for name, shape, dtype in arrays:
+        layout[name] = (offset, shape, dtype)
+        #Every array starts on a multiple of 64 bytes
+        offset += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 64) * 64
+
+    return layout, offset
+
+#Function to open every array of a recording file as a memmap
+def openArrays(path, header, mode):
+    layout = fileLayout(header)[0]
+    return {name: np.memmap(path, dtype, mode, offset, shape) for name, (offset, shape, dtype) in layout.items()}
+
+#Class for recording the frames of a Simulation into a file. The file has room for a set number of frames and particles
+#from the start, maxParticles defaults to twice the particles the simulation has (or the room its particle pool has,
+#if that is more) so pouring more particles in still fits. When there are more particles than that the recording
+#stops there with a warning, the frames recorded until then are kept
+class trajectoryRecorder:
+
+    def __init__(self, path, sim, frames, maxParticles=None, densityStride=0, densityEvery=1, queueSize=64):
+        self.path = path
+        self.frames = frames
+        self.maxParticles = maxParticles or max(2*len(sim.particles), sim.particles.capacity())
+        #The density field is only recorded for the field solver, sph does not build it
+        if sim.solver != "field":
+            densityStride = 0
+        self.densityStride = densityStride
+        self.densityEvery = densityEvery
+
+        self.header = {
+            "version": 1,
+            "frames": frames,
+            "maxParticles": self.maxParticles,
+            "width": sim.width,
+            "height": sim.height,
+            "particleR": float(sim.particles.radius[0]) if len(sim.particles) else 0.0,
+            "particleColor": list(sim.particleColor),
+            "solver": sim.solver,
+            "cellSize": sim.cellSize,
+            "densityStride": densityStride,
+            "densityEvery": densityEvery,
+            "densityFrames": -(-frames // densityEvery),
+            "densityShape": list(sim.dField.field[::max(1, densityStride), ::max(1, densityStride)].shape),
+        }
+
+        #Making the file at its full size with the header at the start, and marking every frame as not written yet
+        fileSize = fileLayout(self.header)[1]
+        text = json.dumps(self.header).encode()
+        if len(magic) + 8 + len(text) > headerSize:
+            raise ValueError("The header of the recording does not fit in " + str(headerSize) + " bytes")
+        with open(path, "wb") as file:
+            file.write(magic + np.int64(len(text)).tobytes() + text)
+            file.truncate(fileSize)
+
+        self.arrays = openArrays(path, self.header, "r+")
+        self.arrays["frameInfo"][:] = -1
+
+        self.written = 0
+        self.stopped = False
+        self.queue = queue.Queue(queueSize)
+        self.writer = threading.Thread(target=self.writeFrames, daemon=True)
+        self.writer.start()
+
+    #Method to record the current state of the simulation as the next frame. The particle arrays are copied here and
+    #written to the file by the writer thread, this only waits when queueSize frames are still waiting to be written.
+    #Returns False when the file is full, or the recording stopped, and nothing was recorded
+    def record(self, sim):
+        if self.written == self.frames or self.stopped:
+            return False
+        count = len(sim.particles)
+        if count > self.maxParticles:
+            warnings.warn("The simulation has " + str(count) + " particles but the recording only has room for " +
+                          str(self.maxParticles) + ", recording stopped after " + str(self.written) + " frames")
+            self.stopped = True
+            return False
+
+        frame = {
+            "index": self.written,
+            "step": sim.stepCount,
+            "position": sim.particles.position.astype(np.float32),
+            "velocity": sim.particles.velocity.astype(np.float32),
+            "color": sim.particles.color.astype(np.uint8),
+        }
+        if self.densityStride > 0 and self.written % self.densityEvery == 0:
+            frame["density"] = sim.dField.field[::self.densityStride, ::self.densityStride].astype(np.float32)
+
+        self.queue.put(frame)
+        self.written += 1
+        return True
+
+    #Method the writer thread runs, writing the frames from the queue until it gets None
+    def writeFrames(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+
+            index, count = frame["index"], len(frame["position"])
+            self.arrays["position"][index, :count] = frame["position"]
+            self.arrays["velocity"][index, :count] = frame["velocity"]
+            self.arrays["color"][index, :count] = frame["color"]
+            if "density" in frame:
+                self.arrays["density"][index // self.densityEvery] = frame["density"]
+            #The frame only counts as written once everything else of it is in the file
+            self.arrays["frameInfo"][index] = (frame["step"], count)
+
+    #Method to wait for every recorded frame to be written and close the file
+    def close(self):
+        if self.writer is None:
+            return
+        self.queue.put(None)
+        self.writer.join()
+        self.writer = None
+
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#Class for reading a recording file, to replay its frames or to restore a simulation to one of them. A recording that
+#was not closed can still be read, up to the last frame the writer thread finished
+class trajectoryReader:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            if file.read(len(magic)) != magic:
+                raise ValueError(str(path) + " is not a fluid simulation recording")
+            length = int(np.frombuffer(file.read(8), np.int64)[0])
+            self.header = json.loads(file.read(length).decode())
+
+        self.arrays = openArrays(path, self.header, "r")
+        #The frames are written in order, so the written ones are all the frames before the first one left at -1
+        unwritten = np.flatnonzero(self.arrays["frameInfo"][:, 1] < 0)
+        self.frames = int(unwritten[0]) if len(unwritten) else self.header["frames"]
+
+    def __len__(self):
+        return self.frames
+
+    #Method to get a frame as the same kind of dictionary Simulation.snapshot returns, with the density field when it
+    #was recorded for that frame
+    def frame(self, index):
+        if not 0 <= index < self.frames:
+            raise IndexError("Frame " + str(index) + " is not in the recording, it has " + str(self.frames) + " frames")
+
+        step, count = self.arrays["frameInfo"][index]
+        velocity = self.arrays["velocity"][index, :count].astype(float)
+        state = {
+            "step": int(step),
+            "position": self.arrays["position"][index, :count].astype(float),
+            "velocity": velocity,
+            "speed": np.hypot(velocity[:, 0], velocity[:, 1]),
+            "color": self.arrays["color"][index, :count].astype(int),
+            "radius": np.full(count, self.header["particleR"]),
+        }
+        if "density" in self.arrays and index % self.header["densityEvery"] == 0:
+            state["density"] = np.array(self.arrays["density"][index // self.header["densityEvery"]])
+
+        return state
+
+    #Method to get the particles of a frame as a particleSystem, so they can be drawn like the simulation's
+    def particles(self, index):
+        state = self.frame(index)
+        particles = particleSystem(self.header["particleR"], state["position"], tuple(self.header["particleColor"]))
+        particles.velocity = state["velocity"]
+        particles.speed = state["speed"]
+        particles.color = state["color"]
+
+        return particles
+
+    #Method to put a Simulation back to a recorded frame so it carries on from there. The positions and velocities were
+    #stored as float32, so the restored run only matches the recorded one up to that rounding
+    def restore(self, sim, index):
+        sim.particles = self.particles(index)
+        sim.stepCount = self.frame(index)["step"]
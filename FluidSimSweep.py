@@ -0,0 +1,176 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from FluidSimCore import Simulation, cellCoordinates
+
+#Parameter sweep runner for the fluid simulation. It runs the Simulation headlessly for a fixed number of steps for
+#every combination of the constants of the model given on the command line (gravity, damping, densityVal, smoothing
+#radius, vector radius multiplier and the strength of the mouse), spread over a pool of worker processes so a sweep
+#uses every core. For every run it saves how fast it stepped and how the fluid behaved, one row per run and one column
+#per parameter or metric, as CSV or as an npz file with an array per column:
+#   stepsPerSecond    steps of the simulation per second, without the time to start it
+#   meanSpeed         mean speed of the particles at the last step
+#   maxSpeed          highest speed of any particle over the whole run
+#   densityVariance   variance of the density at the particles at the last step, lower means a more even fluid
+#   settlingTime      time (in simulated seconds) after which the mean speed stays under --settle-speed, NaN if never
+#
+#Examples:
+#   python FluidSimSweep.py --g 30 68.67 120 --damping 0.5 0.7 0.9 --steps 500 --output sweep.csv
+#   python FluidSimSweep.py --smoothing 10 20 40 --vector-radius 6 12 24 --processes 8 --output sweep.npz
+#   python FluidSimSweep.py --click-strength 0.1 0.25 1 --mouse 250 250 --output mouse.csv
+
+#Names of the parameters that are swept, as the keyword arguments of Simulation, with the values the program uses
+defaultParameters = {
+    "g": [9.81*7],
+    "dampingcoeff": [0.7],
+    "densityVal": [5],
+    "smoothingR": [20],
+    "vectorRadiusMultiplier": [12],
+    "clickStrength": [0.25],
+}
+
+metrics = ["stepsPerSecond", "meanSpeed", "maxSpeed", "densityVariance", "settlingTime"]
+
+#Function to make a configuration for every combination of the values of the parameters
+def makeConfigs(parameters):
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+
+#Function to get the density at every particle, from the cell of the density field it is in for the field solver or
+#from the sums over its neighbours for sph
+def particleDensities(sim):
+    if sim.solver == "sph":
+        return sim.sph.density
+
+    field = sim.dField.field
+    cells = np.round(cellCoordinates(sim.particles.position, sim.cellSize)).astype(int)
+    cols = np.clip(cells[:, 0], 0, field.shape[1] - 1)
+    rows = np.clip(cells[:, 1], 0, field.shape[0] - 1)
+
+    return field[rows, cols]
+
+#Function to get the settling time of a run from the mean speed after every step, the time after which it never goes
+#back over settleSpeed, or NaN when it is still over it at the end
+def settlingTime(meanSpeeds, settleSpeed, timeStep):
+    over = np.flatnonzero(np.asarray(meanSpeeds) >= settleSpeed)
+    if len(over) == 0:
+        return 0.0
+    if over[-1] == len(meanSpeeds) - 1:
+        return float("nan")
+
+    return (over[-1] + 1) * timeStep
+
+#Function to run one configuration headlessly for the given number of steps and return its parameters and metrics.
+#settings holds everything that is the same for every run of the sweep
+def runConfig(config, settings):
+    np.random.seed(settings["seed"])
+    sim = Simulation(settings["width"], settings["height"], settings["particles"], solver=settings["solver"],
+                     cellSize=settings["cellSize"], backend=settings["backend"], **config)
+    sim.useRandom = settings["random"]
+    if settings["mouse"] is not None:
+        sim.setMouse(*settings["mouse"], False)
+
+    meanSpeeds = np.zeros(settings["steps"])
+    maxSpeed = 0.0
+    start = time.perf_counter()
+    for i in range(settings["steps"]):
+        sim.step()
+        speed = np.linalg.norm(sim.particles.velocity, axis=1)
+        meanSpeeds[i] = speed.mean()
+        maxSpeed = max(maxSpeed, float(speed.max()))
+    elapsed = time.perf_counter() - start
+
+    #The density is only built at the start of a step, so it is built once more for the particles where they ended up
+    sim.updateDensity()
+    result = dict(config)
+    result["stepsPerSecond"] = settings["steps"] / elapsed
+    result["meanSpeed"] = float(meanSpeeds[-1])
+    result["maxSpeed"] = maxSpeed
+    result["densityVariance"] = float(np.var(particleDensities(sim)))
+    result["settlingTime"] = settlingTime(meanSpeeds, settings["settleSpeed"], sim.timeStep)
+
+    return result
+
+#Function the worker processes run, taking (config, settings) as one argument for the pool
+def runConfigArgs(args):
+    return runConfig(*args)
+
+#Function to run every configuration over a pool of processes, printing each result as it finishes. The results are
+#returned in the order of the configurations
+def runSweep(configs, settings, processes=None):
+    processes = min(processes or os.cpu_count() or 1, len(configs))
+    results = []
+    if processes <= 1:
+        for config in configs:
+            results.append(runConfig(config, settings))
+            printResult(len(results), len(configs), results[-1])
+        return results
+
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap(runConfigArgs, [(config, settings) for config in configs]):
+            results.append(result)
+            printResult(len(results), len(configs), result)
+
+    return results
+
+#Function to print the result of a run as one line
+def printResult(index, total, result):
+    text = "  ".join(name + " " + str(round(value, 4)) for name, value in result.items())
+    print(str(index).rjust(len(str(total))) + "/" + str(total) + "  " + text)
+
+#Function to save the results with a column for every parameter and metric, as an npz file with an array per column
+#when the path ends in .npz and as CSV otherwise
+def writeResults(results, path):
+    columns = list(results[0])
+    if path.endswith(".npz"):
+        np.savez(path, **{name: np.array([result[name] for result in results]) for name in columns})
+        return
+
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fluid simulation headlessly for every combination of its parameters")
+    parser.add_argument("--g", type=float, nargs="+", default=defaultParameters["g"])
+    parser.add_argument("--damping", type=float, nargs="+", default=defaultParameters["dampingcoeff"])
+    parser.add_argument("--density", type=float, nargs="+", default=defaultParameters["densityVal"])
+    parser.add_argument("--smoothing", type=int, nargs="+", default=defaultParameters["smoothingR"])
+    parser.add_argument("--vector-radius", type=int, nargs="+", default=defaultParameters["vectorRadiusMultiplier"])
+    parser.add_argument("--click-strength", type=float, nargs="+", default=defaultParameters["clickStrength"])
+    parser.add_argument("--mouse", type=int, nargs=2, metavar=("X", "Y"),
+                        help="hold the left mouse button at this point for the whole run, so the click strength matters")
+    parser.add_argument("--particles", type=int, default=500)
+    parser.add_argument("--size", type=int, nargs=2, default=[500, 500], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--solver", choices=["field", "sph"], default="field")
+    parser.add_argument("--cell-size", type=int, default=1)
+    parser.add_argument("--backend", choices=["numpy", "numba"], default="numpy")
+    parser.add_argument("--random", action="store_true", help="add the random forces to the particles")
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--settle-speed", type=float, default=5.0,
+                        help="mean speed the fluid has to stay under to count as settled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, help="worker processes to run the configurations over, all cores by default")
+    parser.add_argument("--output", default="sweep.csv", help="CSV file, or .npz file, to save the results to")
+    args = parser.parse_args()
+
+    parameters = {"g": args.g, "dampingcoeff": args.damping, "densityVal": args.density, "smoothingR": args.smoothing,
+                  "vectorRadiusMultiplier": args.vector_radius, "clickStrength": args.click_strength}
+    settings = {"width": args.size[0], "height": args.size[1], "particles": args.particles, "solver": args.solver,
+                "cellSize": args.cell_size, "backend": args.backend, "random": args.random, "mouse": args.mouse,
+                "steps": args.steps, "settleSpeed": args.settle_speed, "seed": args.seed}
+
+    configs = makeConfigs(parameters)
+    results = runSweep(configs, settings, args.processes)
+    writeResults(results, args.output)
+    print("Saved " + str(len(results)) + " runs to " + args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import collections
+import threading
+
+import numpy as np
+
+import FluidSimJit
+from FluidSimCore import particleSystem, densityField, vectorField
+
+#Running a Simulation on a worker thread while the main thread handles the window and draws it. The worker steps the
+#simulation and copies what is drawn (the particles, and the fields when they are drawn) into the back one of two
+#frameStates, then swaps it to the front. The main thread only ever draws the front frameState, holding a lock while it
+#does so the worker waits to swap until that frame is drawn. Everything that changes the simulation, like the mouse, is
+#sent to the worker through a deque of commands (appending and popping from the two ends of a deque is atomic, so it
+#needs no lock) and run between two steps, so the simulation is never changed in the middle of a step.
+#
+#Example:
+#   threaded = threadedSimulation(sim, frameScheduler(100))
+#   threaded.setRunning(True)
+#   threaded.send(sim.setMouse, 250, 250, False)
+#   state = threaded.acquire()
+#   state.particles.draw(background)
+#   threaded.release()
+#   threaded.close()
+
+#Class for one copy of everything the main thread draws of a Simulation: its particles and its density and vector
+#fields, with the step they were copied at and the memory the fields of the simulation used then
+class frameState:
+
+    def __init__(self, sim):
+        self.solver = sim.solver
+        self.step = -1
+        self.memory = 0
+        self.particles = particleSystem(sim.particleR, np.zeros((0, 2)), sim.particleColor, sim.particles.capacity())
+        #The fields are the same size as the ones of the simulation, which only cover the scene for the field solver
+        self.dField = densityField(sim.dField.width, sim.dField.height, sim.dField.smoothingRadius * sim.cellSize,
+                                   sim.cellSize, sim.dField.field.dtype)
+        self.vField = vectorField(sim.dField.width, sim.dField.height, sim.vField.radius * sim.cellSize, sim.vField.mode,
+                                  sim.cellSize, sim.vField.field.dtype)
+        if sim.dField.tiles is not None:
+            self.dField.useTiles(sim.dField.tiles.tileSize)
+            self.vField.useTiles(self.dField.tiles)
+
+    #Method to copy the particles of the simulation, and its fields when fields is true, into this frameState
+    def copyFrom(self, sim, fields=True):
+        self.step = sim.stepCount
+        self.memory = sim.fieldMemory()
+        count = len(sim.particles)
+        self.particles.reserve(count)
+        self.particles.count = count
+        for name, array in self.particles.pool.items():
+            array[:count] = sim.particles.pool[name][:count]
+
+        if fields and sim.solver == "field":
+            np.copyto(self.dField.field, sim.dField.field)
+            np.copyto(self.vField.field, sim.vField.field)
+            if sim.dField.tiles is not None:
+                self.dField.tiles.active = sim.dField.tiles.active.copy()
+                self.vField.stale = sim.vField.stale.copy()
+
+    #Method to get the memory the fields of the simulation used when it was copied, like Simulation.fieldMemory. It is
+    #measured on the worker thread, the buffers of the simulation can change while the main thread reads them
+    def fieldMemory(self):
+        return self.memory
+
+#Class for stepping a Simulation on a worker thread. The steps run as fast as they can, or in real time with the
+#frameScheduler while pacing is on, and recorder (a trajectoryRecorder) records every step when it is given
+class threadedSimulation:
+
+    def __init__(self, sim, scheduler, recorder=None, pacing=False):
+        self.sim = sim
+        self.scheduler = scheduler
+        self.recorder = recorder
+        self.pacing = pacing
+        #Whether the fields are copied for drawing after every step, they are much larger than the particles
+        self.copyFields = True
+
+        self.commands = collections.deque()
+        self.frames = [frameState(sim), frameState(sim)]
+        self.frames[0].copyFrom(sim)
+        self.front = 0
+        self.frameLock = threading.Lock()
+
+        if sim.backend == "numba":
+            FluidSimJit.startThreads()
+        self.running = threading.Event()
+        self.stopping = False
+        self.error = None
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    #Method to run function(*args) on the worker thread before its next step
+    def send(self, function, *args):
+        self.commands.append((function, args))
+
+    #Method to run every command that was sent, in the order they were sent
+    def runCommands(self):
+        while self.commands:
+            function, args = self.commands.popleft()
+            function(*args)
+
+    #Method to start or pause the steps
+    def setRunning(self, running):
+        if running:
+            self.send(self.scheduler.reset)
+            self.running.set()
+        else:
+            self.running.clear()
+
+    #Method to switch between running the steps in real time with the scheduler and running them as fast as possible
+    def setPacing(self, pacing):
+        self.send(self.scheduler.reset)
+        self.pacing = pacing
+
+    #Method the worker thread runs, stepping the simulation and swapping in a new frameState after every step
+    def work(self):
+        try:
+            while not self.stopping:
+                running = self.running.wait(0.01)
+                self.runCommands()
+                if not running:
+                    continue
+
+                steps = self.scheduler.stepsDue() if self.pacing else 1
+                for i in range(steps):
+                    self.sim.step()
+                    if self.recorder is not None:
+                        self.recorder.record(self.sim)
+
+                self.frames[1 - self.front].copyFrom(self.sim, self.copyFields)
+                with self.frameLock:
+                    self.front = 1 - self.front
+        except Exception as error:
+            self.error = error
+
+    #Method to get the front frameState to draw, which stays the front one until release is called. Raises the error
+    #the worker thread stopped with, if it did
+    def acquire(self):
+        if self.error is not None:
+            raise RuntimeError("The simulation thread stopped") from self.error
+        self.frameLock.acquire()
+        return self.frames[self.front]
+
+    #Method to let the worker swap in newer frames again once the front one is drawn
+    def release(self):
+        self.frameLock.release()
+
+    #Method to stop the worker thread after the step it is on, running the commands still waiting
+    def close(self):
+        if self.worker is None:
+            return
+        self.stopping = True
+        self.worker.join()
+        self.worker = None
+        self.runCommands()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,6 +2,13 @@ import pygame as py
 import math
 import numpy as np
 import time
+import argparse
+
+from FluidSimCore import Simulation, benchmarkVectorField, upscaleImage, frameScheduler, particleEmitter, particleSink
+from FluidSimRecorder import trajectoryRecorder, trajectoryReader
+from FluidSimProfiler import phaseProfiler
+from FluidSimThreaded import threadedSimulation
+import FluidSimKernels
 
 #For the github repository follow this link: https://github.com/pablosabaterlp/EECE2140FinalProject.git
 
@@ -9,376 +16,125 @@ import time
 class window:
 
     #Initializing the window class with a certain width and height. Setting the color of the scene to black
-    #And the caption of the window aswell
-    def __init__(self, width, height):
+    #And the caption of the window aswell. Without a display the scene is drawn onto a surface in memory instead
+    def __init__(self, width, height, display=True):
         self.color = (0, 0, 0)
         self.caption = "Fluid Simulation"
         self.width = width
         self.height = height
 
-        py.display.init()
-        self.screen = py.display.set_mode((self.width, self.height)) 
-        py.display.set_caption(self.caption)
+        if display:
+            py.display.init()
+            self.screen = py.display.set_mode((self.width, self.height))
+            py.display.set_caption(self.caption)
+        else:
+            self.screen = py.Surface((self.width, self.height))
         self.screen.fill(self.color)
-    
+        self.sprites = {}
+        #Font of the text drawn with drawText, made the first time it is needed
+        self.font = None
+
     #Method to update the window
     def updateScreen(self):
 
         py.display.update()
-    
+
     #Method to clear the window
     def clear(self):
         self.screen.fill(self.color)
 
+    #Method to draw an ellipse inside of a rectangle (x, y, width, height) onto the window, used to draw the particles
+    def drawEllipse(self, color, rect):
+        py.draw.ellipse(self.screen, color, rect)
+
+    #Method to draw many ellipses at once from an array of colors and an (N, 4) array of (x, y, width, height) rects,
+    #used to draw all of the particles. Every color and size of ellipse is only drawn once onto a small sprite that is
+    #kept for the next frames, and all the sprites are copied onto the window with one blits call. The rects are cut
+    #down to whole pixels the same way drawEllipse does, so the ellipses come out the same
+    def drawEllipses(self, colors, rects):
+        if len(rects) == 0:
+            return
+        rects = np.asarray(rects).astype(int)
+        colors = np.asarray(colors).astype(int)
+
+        #Packing the color and size of each ellipse into one number, so each different sprite is only looked up once
+        keys = (((colors[:, 0]*256 + colors[:, 1])*256 + colors[:, 2])*65536 + rects[:, 2]*256 + rects[:, 3])
+        uniqueKeys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        sprites = [self.ellipseSprite(tuple(colors[i]), rects[i, 2], rects[i, 3]) for i in first]
+
+        self.screen.blits(zip([sprites[i] for i in inverse.tolist()], rects[:, :2].tolist()), doreturn=False)
+
+    #Method to get the sprite of an ellipse of a color and size, drawing it the first time it is needed. The rest of the
+    #sprite is filled with the opposite color and made see through with a colorkey
+    def ellipseSprite(self, color, width, height):
+        key = (color, width, height)
+        if key not in self.sprites:
+            keyColor = tuple(255 - c for c in color)
+            sprite = py.Surface((width, height))
+            sprite.fill(keyColor)
+            py.draw.ellipse(sprite, color, (0, 0, width, height))
+            sprite.set_colorkey(keyColor)
+            self.sprites[key] = sprite
+
+        return self.sprites[key]
+
+    #Method to write lines of text onto the window with their top left corner at x, y, used for the profiler's overlay.
+    #The font is only made once, finding and loading a system font every frame is slow
+    def drawText(self, lines, x, y):
+        if self.font is None:
+            if not py.font.get_init():
+                py.font.init()
+            self.font = py.font.SysFont("monospace", 14)
+        for line in lines:
+            text = self.font.render(line, True, (255, 255, 255), (0, 0, 0))
+            self.screen.blit(text, (x, y))
+            y += text.get_height()
+
+    #Method to copy a (width, height) array of pixel values straight onto the window, used to draw the fields
+    def blitArray(self, array):
+        py.surfarray.blit_array(self.screen, array)
+
+    #Method to copy an array of pixel values onto the part of the window with its top left corner at x, y, used to
+    #draw the active tiles of the fields
+    def blitArrayAt(self, array, x, y):
+        py.surfarray.blit_array(self.screen.subsurface((x, y) + array.shape), array)
+
+#window that draws onto a surface in memory instead of opening a display, for timing the drawing without a screen
+class offscreenWindow(window):
 
-#Class for a particle
-class particle:
-
-    #Initializing the particle class with the atributes of each particle inclduing x and y positions, aswell as 
-    #radius and color
-    def __init__(self, radius, x, y, color):
-        self.radius = radius
-        self.color = color
-        self.posx = x
-        self.posy = y
-        self.velocityMag = 0
-
-        self.velocity = [0, 0]
-
-    #Drawing the particles onto the screen
-    def draw(self, background):
-        py.draw.ellipse(background.screen, self.color, (self.posx-self.radius, self.posy-self.radius, 2*self.radius + 1, 2*self.radius + 1))
-    
-    #Velocity Methods
-    #====================================
-        
-    #Method to add random velocity to each particle
-    def updateVelocityRandom(self, timeStep):
-        self.velocity[0] += 3*timeStep*np.random.standard_normal()
-        self.velocity[1] += 3*timeStep*np.random.standard_normal()
-
-    #Method to update the velocity of a particle if it collides into a wall
-    def updateVelocityWallColl(self, background, dampingcoeff):
-        if self.posx >= background.width - self.radius - 1 or self.posx <= self.radius:
-            self.velocity[0] *= -1*dampingcoeff
-
-        if self.posy >= background.height - self.radius - 1 or self.posy <= self.radius:
-            self.velocity[1] *= -1*dampingcoeff
-
-    #Method to update the y velocity of a particle with gravity
-    def updateVelocityWithG(self, g, timeStep):
-        self.velocity[1] += g*timeStep
-    
-    #Method to update the velocity of a particle using the vector field.
-    def updateVelocityVField(self, timeStep, densityVal, vField):
-        radius = vField.radius
-        px = round(self.posx)
-        py = round(self.posy)
-
-        #Calculating bounds to use for vector field matrix and distanceMultiplier matrix so that no idex error occurse
-        #(would happen if the particles are close to the edges and they try to use indexes not in the scene)
-        xmin, rxmin = (max(0, px-radius), max(0, radius-px))
-        xmax, rxmax = (min(vField.vectorWidth, px+radius), min(2*radius, radius + vField.vectorWidth-px))
-        ymin, rymin = (max(0, py-radius), max(0, radius-py))
-        ymax, rymax = (min(vField.vectorWidth, py+radius), min(2*radius, radius + vField.vectorHeight-py))
-
-        #Updating x velocity of the particle with sum of all x vectors of vector field, multiplied by how far away they are from the particle
-        #(distanceMultipliier matrix), aswell as the timeStep, and the density which will affect how powerfull they are
-        self.velocity[0] += np.sum(vField.field[ymin:ymax, xmin:xmax, 0]*vField.distanceMultiplier[rymin:rymax, rxmin:rxmax])*timeStep*densityVal
-        
-        #Same for y velocity of the particle
-        self.velocity[1] += np.sum(vField.field[ymin:ymax, xmin:xmax, 1]*vField.distanceMultiplier[rymin:rymax, rxmin:rxmax])*timeStep*densityVal
-    
-    #Method to decelerate particles to attempt to simulate surface tensiono
-    def updateVelocityDeceleration(self, dField):
-
-        radius = dField.smoothingRadius
-        px = round(self.posx)
-        py = round(self.posy)
-
-        #Calculating bounds to use for density field matrix
-        xmin= max(0, px-radius)
-        xmax= min(dField.fieldWidth, px+radius)
-        ymin= max(0, py-radius)
-        ymax= min(dField.fieldHeight, py+radius)
-
-        #setting the multiplier that will affect the particles velocity proportional to how dense the field is around the particle
-        #with a limit of 0.8
-        multiplier = 1 - 0.2*np.sum(dField.field[ymin:ymax, xmin:xmax])/((2*radius+1)**2)
-
-        #multiplying the velocities by the multiplier to decrease them
-        self.velocity[0] *= multiplier
-        self.velocity[1] *= multiplier
-    
-    #Method to update the velocity of the particles using all of the different velocity methods
-    def updateVelocity(self, g, dampingcoeff, timeStep, background, gtrue, rtrue, dtrue, densityVal, vField, densityF):
-        #If statements to check which velocity methods should be used to affect the particle
-        if gtrue:
-            self.updateVelocityWithG(g, timeStep)
-        if rtrue:
-            self.updateVelocityRandom(timeStep)
-        if dtrue:
-            self.updateVelocityDeceleration(densityF)
-
-        #Update the velocity of using the vector field
-        self.updateVelocityVField(timeStep, densityVal, vField)
-        
-        #Find the magnitude of the velocity of the particle
-        self.velocityMag = (self.velocity[0]**2 + self.velocity[1]**2)**0.5
-
-        #Update the velocity using teh wall collision method
-        self.updateVelocityWallColl(background, dampingcoeff)
-    #====================================
-
-    #Position Methods
-    #====================================
-    
-    #Method to check if a particle has collided into a wall
-    def checkWallCollision(self, pos, velocity, wall):
-        #Checking if the particles position +- its radius is outside one of the walls bounds
-        #If so, not adding velocity but making it touch the wall dirrectly
-        #Also reversing its velocity so it bounces backwards
-        if pos + velocity >= self.radius and pos + velocity <= wall - 1 - self.radius:
-            pos = pos + velocity
-        else:
-            pos = self.radius if pos < wall/10 else wall - self.radius - 1
-        
-        return pos
-    
-    #Method to update the position with the particles velocity. It simoltenusly checks for wall collisions
-    def updatePosition(self, background):
-
-        self.posx = self.checkWallCollision(self.posx, self.velocity[0], background.width)
-        self.posy = self.checkWallCollision(self.posy, self.velocity[1], background.height)
-    
-    #====================================
-    #Method to update the color of the particle based on its velocity
-    def updateColor(self):
-        newColor = list(self.color)
-
-        newColor[0] = round(255 * min(1, self.velocityMag/10))
-        self.color = tuple(newColor)
-
-#Class for the density field calculations
-class densityField():
-
-    #Initialize the density field object that has the attributes of screen width and height,
-    #and the radius around each particle
-    def __init__(self, width, height, radius):
-        self.fieldWidth = width
-        self.fieldHeight = height
-        self.field = np.zeros((height, width))
-        self.smoothingRadius = radius
-
-        self.addDensity = np.zeros((2*radius+1, 2*radius+1))
-        self.addDensityMatrix()
-
-  #Method for creating the matrix that will add onto the density field matrix for each particle position
-    def addDensityMatrix(self):
-        pixelx = -self.smoothingRadius
-        pixely = -self.smoothingRadius
-       
-        for i in range(0, round((2*self.smoothingRadius+1)**2)):
-            distance = (pixelx**2 + pixely**2)**0.5
-            if distance <= self.smoothingRadius:
-                self.addDensity[pixely+self.smoothingRadius, pixelx+self.smoothingRadius] += (1.0001 - (distance/self.smoothingRadius)**3)**6
-
-            pixelx += 1
-            if pixelx > self.smoothingRadius:
-                pixelx = -self.smoothingRadius
-                pixely += 1
-
-    #Method to update the density field after actions have been performed to it
-    def updateField(self, particle):
-        px = round(particle.posx)
-        py = round(particle.posy)
-
-        xmin, rxmin = (max(0, px-self.smoothingRadius), max(0, self.smoothingRadius-px))
-        xmax, rxmax = (min(self.fieldWidth, px+self.smoothingRadius), min(2*self.smoothingRadius, self.smoothingRadius + self.fieldWidth-px))
-        ymin, rymin = (max(0, py-self.smoothingRadius), max(0, self.smoothingRadius-py))
-        ymax, rymax = (min(self.fieldHeight, py+self.smoothingRadius), min(2*self.smoothingRadius, self.smoothingRadius + self.fieldHeight-py))
-
-        self.field[ymin:ymax, xmin:xmax] += self.addDensity[rymin:rymax, rxmin:rxmax]
-
-
-    def normalizeField(self):
-        self.field /= 5
-        
-    #Method to clear the field by adding all zeros to the field
-    def clearField(self):
-        self.field = np.zeros((self.fieldHeight, self.fieldWidth))
-
-    #Method to draw the field around each particle
-    def drawDensityField(self, background):
-        py.surfarray.blit_array(background.screen, (self.field.T/self.field.max()) *255)
-        
-#Class for the velocity vector field to affect motion of the particles
-class vectorField():
-
-    #Initialize the vector field that has the attributes of the window width and height,
-    #and the radius of the vector field itself.
-    def __init__(self, width, height, radius):
-        self.vectorWidth = width
-        self.vectorHeight = height
-        self.field = np.zeros((height, width, 2))
-        self.xGrid3D, self.yGrid3D = vectorField.initializeGrids(height, width)
-        self.radius = radius
-        self.distanceMultiplier = vectorField.initializeDistanceMatrix(radius)
-
-    #Method to create/start the vector field using a series of 3D arrays
-    def initializeGrids(h, w):
-        xGrid3D = np.stack([np.full((h, w), -1), np.ones((h, w)), np.zeros((h, w)), np.zeros((h, w))], axis=2)
-        yGrid3D = np.stack([np.zeros((h, w)), np.zeros((h, w)), np.ones((h, w)), np.full((h, w), -1)], axis=2)
-
-        return xGrid3D, yGrid3D
-    
-    #Method to create a matrix that holds values where the center of the matrix is 1, and the values
-    #decrease as they get further away. The matrix holds 0 for any value outside the radius inputed
-    def initializeDistanceMatrix(radius):
-        pixelx = -radius
-        pixely = -radius
-
-        distanceMultiplier = np.zeros((2*radius+1, 2*radius+1))
-        
-        #For every element in the matrix, set its value to a function of its distance to the center
-        for i in range(0, round((2*radius+1)**2)):
-            distance = (pixelx**2 + pixely**2)**0.5
-            if distance <= radius:
-                distanceMultiplier[pixely+radius, pixelx+radius] += (1.0001 - (distance/radius)**3)**6
-
-            pixelx += 1
-            if pixelx > radius:
-                pixelx = -radius
-                pixely += 1
-        
-        return distanceMultiplier
-    
-    #Method to shift density fields in order to calculate the dirrection each vector of the grid should go in
-    def updateVectorField(self, dField):
-        #By creating 4 new arrays/planes that are shifted on pixel up, left, down, and right, it is less intensive to read all the surrounding density values
-        #of a point on the map to find out which way the velocity vector should go
-
-        #Creating shiften arrays in all 4 cardinal directions of the density field to then sort them. The edges of the field
-        #are replaced with 1s (highest value) to encourage vector to go away from the edges
-        densityLEFT = np.hstack((dField[:,1:], np.ones((self.vectorHeight,1))))
-        densityRIGHT = np.hstack((np.ones((self.vectorHeight,1)), dField[:,:-1]))
-        densityDOWN = np.vstack((np.ones((1,self.vectorWidth)), dField[:-1,:]))
-        densityUP = np.vstack((dField[1:,:], np.ones((1,self.vectorWidth))))
-
-        #Creating a 3D matrix out of the shifted matrices
-        densityStack = np.stack([densityLEFT, densityRIGHT, densityDOWN, densityUP], axis=2)
-        #Creating a sorting index matrix to then take_along_axis only the values of direction that point away from
-        #the highest density value in the densityStack
-        densityPicks = np.argsort(densityStack, axis=2)
-
-        #Taking from the xGrid3D using the sorting matrix created by the preveius two lines. Taking the 4th index
-        #along the 3rd axis because it corresponds to what the heighest density values where in the 3D density stack
-        xVectors = np.take_along_axis(self.xGrid3D, densityPicks, axis=2)[:,:,3]
-        #Same for yGrid
-        yVectors = np.take_along_axis(self.yGrid3D, densityPicks, axis=2)[:,:,3]
-
-        #Multiplying the dirrection x and y matrixes by the density field to scale their strength
-        xVectorsWDensity = xVectors * dField
-        yVectorsWDensity = yVectors * dField
-
-        #Combining the two x and y velocities into one 3D Matrix representing the velocity vector field
-        self.field = np.stack([xVectorsWDensity, yVectorsWDensity], axis=2)
-    
-
-    #Method to draw the vector field around each particle, the more transparent it is the less dense that area is.
-    def drawVectorField(self, background):
-        
-        #normalizing the field first
-        normalField = self.field / self.field.max()
-
-        #updating the python pixelarray's color
-        py.surfarray.blit_array(background.screen, normalField[:,:,1].T*255 + normalField[:,:,0].T*255**2)
-
-class changeVectorField():
-
-    #Constructor for initializing the velocity vector field
-    def __init__(self, radius, strength):
-        self.radius = radius
-        self.strength = strength
-        self.vectorRadiusDensity = self.initializeRadiusMatrix()
-
-    #Method to initialize the vectorRadiusDensity in order to be able to affect the vector field matrix
-    #With the mouse clicks at a certain position
-    def initializeRadiusMatrix(self):
-        pixelx = -self.radius
-        pixely = -self.radius
-        vectorX = 1
-        vectorY = 1
-
-        vectorRadiusDensityX = np.zeros((2*self.radius+1, 2*self.radius+1))
-        vectorRadiusDensityY = np.zeros((2*self.radius+1, 2*self.radius+1))
-       
-        for i in range(0, round((2*self.radius+1)**2)):
-            distance = (pixelx**2 + pixely**2)**0.5
-            if  pixelx < 0:
-                vectorX = 1
-            elif pixelx == 0:
-                vectorX = 0
-            else:
-                vectorX = -1
+    def __init__(self, width, height):
+        super().__init__(width, height, display=False)
 
-            if pixely < 0:
-                vectorY = 1
-            elif pixely == 0:
-                vectorY = 0
-            else:
-                vectorY = -1
-            
-            if distance <= self.radius:
-                vectorRadiusDensityX[pixely+self.radius, pixelx+self.radius] += vectorX * self.strength  * (1 + 2*abs(pixely)/(2*self.radius)) * (1.0001 - (1.0001 - (distance/self.radius)**1)**21)
-                vectorRadiusDensityY[pixely+self.radius, pixelx+self.radius] += vectorY * self.strength  * (1 + 2*abs(pixely)/(2*self.radius)) *(1.0001 - (1.0001 - (distance/self.radius)**1)**21)
-
-            pixelx += 1
-            if pixelx > self.radius:
-                pixelx = -self.radius
-                pixely += 1
-            
-            vectorRadiusDensity = np.stack([vectorRadiusDensityX, vectorRadiusDensityY], axis=2)
-
-        return vectorRadiusDensity
-
-    #Method for updating the velocity vector matrix at a specific point of the mouse
-    def updateVectorMatrix(self, px, py, vField, mouseRight):
-        
-        xmin, rxmin = (max(0, px-self.radius), max(0, self.radius-px))
-        xmax, rxmax = (min(vField.vectorWidth, px+self.radius), min(2*self.radius, self.radius + vField.vectorWidth-px))
-        ymin, rymin = (max(0, py-self.radius), max(0, self.radius-py))
-        ymax, rymax = (min(vField.vectorHeight, py+self.radius), min(2*self.radius, self.radius + vField.vectorHeight-py))
-
-        reverse = 1
-        if mouseRight:
-            reverse = -1
-        
-        vField.field[ymin:ymax, xmin:xmax, 0] += self.vectorRadiusDensity[rymin:rymax, rxmin:rxmax, 0] * reverse
-        vField.field[ymin:ymax, xmin:xmax, 1] += self.vectorRadiusDensity[rymin:rymax, rxmin:rxmax, 1] * reverse
-
-        return vField
- 
-#Function to make all the particles at the beggining of the program.
-def makeParticles(amnt, radius, color, background):
-    px = round(background.width/2 - (round(amnt**0.5)*(radius*2+1))/2 + radius )
-    py = round(background.height/2 - (round(amnt**0.5)*(radius*2+1))/2 + radius )
-    
-    particles = []
-    for i in range(0, amnt):
-        particles.append(particle(radius, px, py, color))
-        px += radius*2+1
-
-        if px > background.width/2 + (round(amnt**0.5)*(radius*2+1))/2:
-            
-            px = round(background.width/2 - (round(amnt**0.5)*(radius*2+1))/2 + radius)
-            py += radius*2+1
-
-    
-    return particles
-
-#Create the main function in which all actions will be performed
-def main():
+    #There is no display to update
+    def updateScreen(self):
+        pass
+
+
+#Function to call a function that changes the arrays of the simulation, through the worker thread's queue when the
+#simulation steps on one so it runs between two steps, and straight away otherwise
+def changeSimulation(threaded, function, *args):
+    if threaded is None:
+        function(*args)
+    else:
+        threaded.send(function, *args)
+
+#Create the main function in which all actions will be performed. The simulation itself runs in the Simulation
+#object, this function only handles the window, the key presses and the mouse, and draws the simulation.
+#The solver is "field" for the density and vector fields or "sph" for forces between the particles, and the fields
+#have a cell for every cellSize by cellSize pixels. The backend is "numba" to run the hot loops compiled, "numpy" to
+#run them as numpy, or "auto" to use numba when it is installed. With record set to a file name every frame that is
+#stepped is recorded to it, up to recordFrames frames.
+#Every step is split into substeps, or into as many as the fastest particle needs with adaptive. With stepsPerSecond
+#the simulation starts out running that many steps per second of real time (T switches it on and off, at 1/timeStep
+#steps per second by default), running up to maxStepsPerFrame steps for one drawn frame when it falls behind.
+#H shows the time every phase of a frame takes, and with profileCsv the times of every frame are saved to that file.
+#sphKernel is the kernel of FluidSimKernels the sph solver uses and layout how the particles are laid out at the start.
+#With a tileSize the fields are only built and drawn on the tiles of that many cells around the particles.
+#With threadedPhysics the simulation steps on a worker thread while this thread handles the window and draws the
+#latest finished step, and the profiler only times this thread. fieldDtype is what the fields are stored as
+def main(solver="field", cellSize=1, backend="auto", record=None, recordFrames=10000, substeps=1, adaptive=False,
+         stepsPerSecond=None, maxStepsPerFrame=5, profileCsv=None, sphKernel="smoothing", layout="grid", tileSize=None,
+         threadedPhysics=False, fieldDtype="float64"):
     #Create the variables for the size of the screen
     sceneWidth = 500
     sceneHeight = 500
@@ -389,22 +145,32 @@ def main():
     #Create the variable for timeStep which will slow down the program
     timeStep = 0.01
     #Create the variables for the number of particles, their color, radius, and multiplier which will allow for the creation of the particle object
-    particles = 500 
+    particles = 500
     particleColor = (0, 163, 108)
     particleR = 4
-    vectorRadiusMultiplier = 12 
-    
-    smoothingR = 20
+    vectorRadiusMultiplier = 12
 
-    #Create the objects for the background and the particles using the variables defined above.
+    smoothingR = 20
+    clickRadius = 100
+
+    #Create the simulation, which holds the particles, the density field, vector field, and changeVectorField which will
+    #create a vector field around the mouse upon click, and the window to draw it on, using the variables defined above.
+    sim = Simulation(sceneWidth, sceneHeight, particles, particleR, particleColor, g, dampingcoeff, densityVal,
+                     timeStep, smoothingR, vectorRadiusMultiplier, clickRadius, 0.25, solver=solver, cellSize=cellSize,
+                     backend=backend, sphKernel=sphKernel, layout=layout, tileSize=tileSize, fieldDtype=fieldDtype)
+    sim.substeps = substeps
+    sim.adaptiveSubsteps = adaptive
+    #The emitter pours 10 particles a step in from the top of the scene and the drain removes the particles that reach
+    #the bottom, E and K switch them on and off
+    emitter = particleEmitter(sceneWidth/2 - 50, particleR + 5, 10, velocity=(0, 2), spread=0.5, width=100, height=10)
+    drain = particleSink(0, sceneHeight - 2*particleR - 4, sceneWidth, 2*particleR + 4)
     background = window(sceneWidth, sceneHeight)
-    particles = makeParticles(particles, particleR, particleColor, background)
-
-    #Create the objects for the density field, vector field, and changeVectorField which will 
-    #create a vector field around the mouse upon click
-    dField = densityField(sceneWidth, sceneHeight, smoothingR)
-    vField = vectorField(sceneWidth, sceneHeight, vectorRadiusMultiplier)
-    clickMouse = changeVectorField(100, 0.25)
+    scheduler = frameScheduler(stepsPerSecond or 1/timeStep, maxStepsPerFrame)
+    recorder = trajectoryRecorder(record, sim, recordFrames, densityStride=4, densityEvery=10) if record else None
+    #The profiler is only used while its overlay is shown or its times are being saved
+    profiler = phaseProfiler(recording=profileCsv is not None)
+    profiling = profileCsv is not None
+    sim.profiler = profiler if profiling and not threadedPhysics else None
 
     #Set conditions for the display of the particles and fields upon starting the program, these will
     #be switched upon respective key presses
@@ -412,60 +178,84 @@ def main():
     animate = False
     drawParticles = True
     drawField = False
-    drawPVelocity = True
-    addTimeDelay = False
-    useGravity = True
-    useRandom = False
-    useVField = True
-    useDecel = True
+    addTimeDelay = stepsPerSecond is not None
     drawVField = False
     clickLeft = False
     clickRight = False
-    addMore = False
+    drawProfiler = False
+    lastMouse = None
+    lastDrawn = None
 
-    moreDelay = 0
+    #The worker thread starts out paused like the animation
+    threaded = threadedSimulation(sim, scheduler, recorder, addTimeDelay) if threadedPhysics else None
 
-    #Draw the number of particles specified in the particle class object created above, with their attributes also created above
-    for p in particles:
-        p.draw(background)
+    #Draw the number of particles specified in the simulation created above, with their attributes also created above
+    sim.particles.draw(background)
 
     #Update the screen to show all the particles drawn
     background.updateScreen()
 
     print("Done")
-   
+
     #While loop that will continuously run the program as long as the user doesn't click quit
     while run:
+        if profiling:
+            profiler.startFrame()
 
         #Check every event possible in pygame, including keyboard pressed, clicks, etc.
         for event in py.event.get():
             #If the user clicks quit, end the while loop and the program.
-            if event.type == py.QUIT: 
+            if event.type == py.QUIT:
                 run = False
             #If the event is a key press, check which one and inverse the respective condition from above which will cause a program change
             if event.type == py.KEYDOWN:
                 if event.key == py.K_SPACE:
                     animate = not animate
+                    scheduler.reset()
+                    if threaded is not None:
+                        threaded.setRunning(animate)
                 if event.key == py.K_p:
                     drawParticles = not drawParticles
                 if event.key == py.K_d:
                     drawField = not drawField
                 if event.key == py.K_t:
                     addTimeDelay = not addTimeDelay
+                    scheduler.reset()
+                    if threaded is not None:
+                        threaded.setPacing(addTimeDelay)
+                #Switching the flags of the simulation is safe while it steps on the worker thread, everything that
+                #changes its arrays goes through changeSimulation
                 if event.key == py.K_g:
-                    useGravity = not useGravity
+                    sim.useGravity = not sim.useGravity
                 if event.key == py.K_r:
-                    useRandom = not useRandom
+                    sim.useRandom = not sim.useRandom
                 if event.key == py.K_v:
                     drawVField = not drawVField
                 if event.key == py.K_f:
-                    useDecel = not useDecel
+                    sim.useDecel = not sim.useDecel
                 if event.key == py.K_m:
-                    addMore = not addMore
+                    sim.addMore = not sim.addMore
                 if event.key == py.K_a:
-                    drawPVelocity = not drawPVelocity
-                    for p in particles:
-                        p.color = particleColor
+                    sim.colorByVelocity = not sim.colorByVelocity
+                    changeSimulation(threaded, sim.resetColor)
+                if event.key == py.K_e:
+                    sim.emitters = [] if emitter in sim.emitters else [emitter]
+                if event.key == py.K_k:
+                    sim.sinks = [] if drain in sim.sinks else [drain]
+                if event.key == py.K_h:
+                    drawProfiler = not drawProfiler
+                    profiling = drawProfiler or profileCsv is not None
+                    sim.profiler = profiler if profiling and threaded is None else None
+                #The brackets change the smoothing radius and - and = the radius around the mouse, the kernels for
+                #every radius are cached so going back to one is instant
+                if event.key in (py.K_LEFTBRACKET, py.K_RIGHTBRACKET):
+                    smoothingR = max(2, smoothingR + (2 if event.key == py.K_RIGHTBRACKET else -2))
+                    changeSimulation(threaded, sim.setSmoothingRadius, smoothingR)
+                    print("Smoothing radius", smoothingR)
+                if event.key in (py.K_MINUS, py.K_EQUALS):
+                    clickRadius = max(10, clickRadius + (10 if event.key == py.K_EQUALS else -10))
+                    changeSimulation(threaded, sim.setClickRadius, clickRadius)
+                    print("Mouse radius", clickRadius)
             #If the event is a mouse click, check which mouse button and set the correct variable to true
             if event.type == py.MOUSEBUTTONDOWN:
                 if py.mouse.get_pressed()[0]:
@@ -474,52 +264,164 @@ def main():
                 elif py.mouse.get_pressed()[2]:
                     clickRight = True
                     clickLeft = False
-            
+
             #When the click is released, set both variables to false to stop the action
             elif event.type == py.MOUSEBUTTONUP:
                 clickLeft = False
                 clickRight = False
 
-        
+
         #The following if statements check the variable booleans created above to see what should be drawn, taken away, created, etc.
-        #According to which is true, the corresponding method from the corresponding class is called with the parameters it requires, causing it's respective action.
+        #According to which is true, the simulation is stepped and the corresponding fields and particles are drawn from it.
         if animate:
-            background.clear()
-            dField.clearField()
-            if addMore:
-                if moreDelay == 0:
-                    particles.append(particle(particleR, particleR+5, particleR+5, particleColor))
-                    particles[-1].velocity[0] += 3
-
-                    moreDelay = -1
-                moreDelay += 1
-            #=====
-            for p in particles:
-    
-                dField.updateField(p)
-            dField.normalizeField() 
-            if drawField:
-                dField.drawDensityField(background)
-            #=====
-            vField.updateVectorField(dField.field)
-            if clickLeft or clickRight:
-                mousepos = py.mouse.get_pos()
-                vField.vectorField = clickMouse.updateVectorMatrix(mousepos[0], mousepos[1], vField, clickRight)
-            if drawVField:
-                vField.drawVectorField(background)
+            #The mouse is only sent to the worker thread when it changes
+            mouse = py.mouse.get_pos() + (clickRight,) if clickLeft or clickRight else None
+            if threaded is None or mouse != lastMouse:
+                if mouse is not None:
+                    changeSimulation(threaded, sim.setMouse, *mouse)
+                else:
+                    changeSimulation(threaded, sim.releaseMouse)
+            lastMouse = mouse
+            if profiling:
+                profiler.lap("events")
+
+            if threaded is None:
+                #With the time delay on, the scheduler says how many steps are due in real time since the last frame
+                steps = scheduler.stepsDue() if addTimeDelay else 1
+                if profiling:
+                    profiler.lap("wait")
+                for i in range(steps):
+                    sim.step()
+                    if recorder is not None:
+                        recorder.record(sim)
+                        if profiling:
+                            profiler.lap("record")
+                view = sim
+            else:
+                #Drawing the latest step the worker thread finished, or waiting a little when it is still the one
+                #that was drawn last
+                threaded.copyFields = drawField or drawVField
+                view = threaded.acquire()
+                if view.step == lastDrawn:
+                    threaded.release()
+                    time.sleep(0.001)
+                    continue
+                lastDrawn = view.step
             #=====
-            for p in particles:
-                p.updateVelocity(g, dampingcoeff, timeStep, background, useGravity, useRandom, useDecel, densityVal, vField, dField)
-                p.updatePosition(background)
-                if drawPVelocity:
-                    p.updateColor()
-                if drawParticles:
-                    p.draw(background)
+            background.clear()
+            #The fields are only built by the field solver
+            if drawField and view.solver == "field":
+                view.dField.drawDensityField(background)
+                if profiling:
+                    profiler.lap("drawDensity")
+            if drawVField and view.solver == "field":
+                view.vField.drawVectorField(background)
+                if profiling:
+                    profiler.lap("drawVectors")
+            if drawParticles:
+                view.particles.draw(background)
+                if profiling:
+                    profiler.lap("drawParticles")
+            if threaded is not None:
+                threaded.release()
             #=====
             if addTimeDelay:
                 py.draw.rect(background.screen, (255, 0, 0), (0, 0, 24, 24))
+            if drawProfiler:
+                background.drawText(profiler.summary(), 30, 4)
             background.updateScreen()
-            if addTimeDelay:
-                time.sleep(timeStep)
+            if profiling:
+                profiler.lap("display")
+                profiler.endFrame(len(view.particles), view.fieldMemory())
+
+    if threaded is not None:
+        threaded.close()
+    if recorder is not None:
+        recorder.close()
+    if profileCsv is not None:
+        profiler.writeCsv(profileCsv)
+
+#Function to play back a recording made with --record without running the simulation. SPACE pauses it, P and D toggle
+#the particles and the recorded density field, and it starts over after the last frame
+def replay(path):
+    reader = trajectoryReader(path)
+    if len(reader) == 0:
+        print("The recording has no frames")
+        return
+    background = window(reader.header["width"], reader.header["height"])
+
+    run = True
+    animate = True
+    drawParticles = True
+    drawField = False
+    index = 0
+    density = None
+
+    while run:
+        for event in py.event.get():
+            if event.type == py.QUIT:
+                run = False
+            if event.type == py.KEYDOWN:
+                if event.key == py.K_SPACE:
+                    animate = not animate
+                if event.key == py.K_p:
+                    drawParticles = not drawParticles
+                if event.key == py.K_d:
+                    drawField = not drawField
+
+        #The density is only recorded on some frames, the last one recorded is drawn until the next one
+        state = reader.frame(index)
+        if "density" in state:
+            density = state["density"]
 
-main()
+        background.clear()
+        if drawField and density is not None and density.max() > 0:
+            scale = reader.header["cellSize"] * reader.header["densityStride"]
+            background.blitArray(upscaleImage((density.T/density.max()) *255, scale, background.width, background.height))
+        if drawParticles:
+            reader.particles(index).draw(background)
+        background.updateScreen()
+
+        if animate:
+            index = (index + 1) % len(reader)
+        time.sleep(0.01)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interactive fluid simulation")
+    parser.add_argument("--sph", action="store_true", help="use forces between the particles instead of the fields")
+    parser.add_argument("--sph-kernel", choices=list(FluidSimKernels.kernels), default="smoothing",
+                        help="kernel the sph solver spreads the particles with")
+    parser.add_argument("--layout", choices=["grid", "disc", "random"], default="grid",
+                        help="how the particles are laid out at the start")
+    parser.add_argument("--cell-size", type=int, default=1, help="pixels per cell of the density and vector fields")
+    parser.add_argument("--backend", choices=["auto", "numpy", "numba"], default="auto",
+                        help="run the hot loops compiled with numba or as numpy")
+    parser.add_argument("--tile-size", type=int,
+                        help="only build and draw the fields on tiles of this many cells around the particles")
+    parser.add_argument("--field-dtype", choices=["float64", "float32", "float16"], default="float64",
+                        help="store the density and vector fields as this type, smaller types use less memory")
+    parser.add_argument("--threaded", action="store_true",
+                        help="step the simulation on a worker thread while the main thread draws the latest step")
+    parser.add_argument("--substeps", type=int, default=1, help="substeps every time step is split into")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="use more substeps when the fastest particle would move too far in one")
+    parser.add_argument("--steps-per-second", type=float,
+                        help="run this many steps per second of real time, skipping frames when drawing falls behind")
+    parser.add_argument("--max-steps-per-frame", type=int, default=5,
+                        help="most steps run for one drawn frame when drawing falls behind")
+    parser.add_argument("--profile-csv", metavar="FILE", help="save the time every phase of every frame takes to a CSV file")
+    parser.add_argument("--record", metavar="FILE", help="record every frame of the simulation to a file")
+    parser.add_argument("--record-frames", type=int, default=10000, help="how many frames the recording has room for")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recording instead of running the simulation")
+    parser.add_argument("--benchmark-vfield", type=int, nargs="*", metavar="SIZE",
+                        help="time the vector field modes on a WIDTH HEIGHT scene instead of running the simulation")
+    args = parser.parse_args()
+
+    if args.benchmark_vfield is not None:
+        benchmarkVectorField(*args.benchmark_vfield[:2])
+    elif args.replay:
+        replay(args.replay)
+    else:
+        main("sph" if args.sph else "field", args.cell_size, args.backend, args.record, args.record_frames, args.substeps,
+             args.adaptive, args.steps_per_second, args.max_steps_per_frame, args.profile_csv, args.sph_kernel,
+             args.layout, args.tile_size, args.threaded, args.field_dtype)
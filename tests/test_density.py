@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from FluidSimCore import densityField
+
+#Function to make particle positions all over a width by height scene, with some right on its edges and corners and
+#some close enough to the edges that their kernels are cut off
+def edgePositions(width, height, count=300, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = np.column_stack([rng.uniform(0, width - 1, count), rng.uniform(0, height - 1, count)])
+    edges = [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1), (0, height/2), (width - 1, height/2),
+             (width/2, 0), (width/2, height - 1), (3, 5), (width - 4, height - 6)]
+    return np.vstack([positions, edges])
+
+#Function to build the normalized field the way the program first did it, one particle at a time
+def fieldOneAtATime(width, height, radius, cellSize, positions):
+    dField = densityField(width, height, radius, cellSize)
+    for x, y in positions:
+        dField.updateFieldAt(x, y)
+    dField.normalizeField()
+
+    return dField.field
+
+#Test that adding all of the particles at once with every bulk method gives the same normalized field as adding them
+#one at a time, scatter only adds them in another order and convolve matches up to the rounding of the FFTs
+@pytest.mark.parametrize("cellSize", [1, 3])
+@pytest.mark.parametrize("radius", [1, 6, 20])
+@pytest.mark.parametrize("method", ["scatter", "convolve"])
+def testBulkFieldMatchesOneAtATime(method, radius, cellSize):
+    width, height = 157, 121
+    positions = edgePositions(width, height)
+    expected = fieldOneAtATime(width, height, radius, cellSize, positions)
+
+    dField = densityField(width, height, radius, cellSize)
+    dField.updateFieldBulk(positions, method)
+    dField.normalizeField()
+
+    np.testing.assert_allclose(dField.field, expected, rtol=0, atol=1e-12 * expected.max())
+    if method == "scatter":
+        np.testing.assert_array_equal(dField.field == 0, expected == 0)
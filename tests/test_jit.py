@@ -0,0 +1,58 @@
+import copy
+
+import numpy as np
+import pytest
+
+import FluidSimJit
+from FluidSimCore import Simulation
+
+pytestmark = pytest.mark.skipif(not FluidSimJit.available, reason="numba is not installed")
+
+#Function to make a simulation a few steps in, so the particles are moving and the fields are not empty, with the
+#fields built for the particles where they are now
+def movingSimulation():
+    np.random.seed(0)
+    sim = Simulation(300, 240, 400, backend="numpy")
+    sim.useRandom = True
+    sim.setMouse(150, 120, False)
+    sim.step(5)
+    sim.updateFields()
+
+    return sim
+
+#Test that the compiled particle loop moves the particles the same as the numpy updateVelocity, updatePosition and
+#updateColor from the same state, with gravity, the random forces, the deceleration and a scale for substeps
+@pytest.mark.parametrize("scale", [1, 0.5])
+def testStepParticlesMatchesNumpy(scale):
+    sim = movingSimulation()
+    sim.vField.sampling = sim.dField.sampling = "window"
+    numpyParticles = copy.deepcopy(sim.particles)
+    jitParticles = copy.deepcopy(sim.particles)
+    timeStep = sim.timeStep * scale
+
+    np.random.seed(1)
+    numpyParticles.updateVelocity(sim.g, sim.dampingcoeff, timeStep, sim, True, True, True, sim.densityVal, sim.vField,
+                                  sim.dField, scale)
+    numpyParticles.updatePosition(sim, scale)
+    numpyParticles.updateColor()
+
+    np.random.seed(1)
+    jitParticles.updateJit(sim.g, sim.dampingcoeff, timeStep, sim, True, True, True, sim.densityVal, sim.vField,
+                           sim.dField, True, scale)
+
+    for name in ("position", "velocity", "speed"):
+        np.testing.assert_allclose(getattr(jitParticles, name), getattr(numpyParticles, name), rtol=1e-12, atol=1e-9)
+    np.testing.assert_array_equal(jitParticles.color, numpyParticles.color)
+
+#Test that the compiled density loop builds the same field as scattering the particles with numpy
+@pytest.mark.parametrize("radius", [1, 20])
+def testSplatDensityMatchesScatter(radius):
+    sim = movingSimulation()
+    sim.dField.setRadius(radius)
+    fields = {}
+    for method in ("scatter", "jit"):
+        sim.dField.clearField()
+        sim.dField.updateFieldBulk(sim.particles.position, method)
+        fields[method] = sim.dField.field.copy()
+
+    np.testing.assert_allclose(fields["jit"], fields["scatter"], rtol=0, atol=1e-12 * fields["scatter"].max())
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from FluidSimCore import Simulation
+from FluidSimParallel import parallelSimulation
+
+#Test that the strips of several workers move the particles exactly like Simulation does, step after step. Without the
+#random forces both start from the same particles, and every particle has to be moved once per step by the strip it
+#started the step in. With a height of 120 the starting block of particles goes past the top and bottom walls, and
+#those particles have to be moved back inside by the first and last strips
+@pytest.mark.parametrize("height, particles, workers", [(300, 400, 2), (300, 400, 3), (120, 300, 4)])
+def testParallelTrajectoriesMatchSimulation(height, particles, workers):
+    np.random.seed(0)
+    sim = Simulation(300, height, particles, backend="numpy")
+    with parallelSimulation(300, height, particles, workers=workers) as parallel:
+        for i in range(20):
+            sim.step()
+            parallel.step()
+            expected, state = sim.snapshot(True), parallel.snapshot(True)
+            for name in ("position", "velocity", "density", "vectors"):
+                np.testing.assert_array_equal(state[name], expected[name])
+
+#Test that a particle crossing from one strip into the next in a step is only moved once
+def testParticleCrossingStripsMovesOnce():
+    with parallelSimulation(200, 500, 1, workers=2) as parallel:
+        parallel.useDecel = False
+        parallel.particles.position[0] = (100, 249)
+        parallel.particles.velocity[0] = (0, 3.2)
+        parallel.step()
+        moved = parallel.particles.position[0, 1] - 249
+        velocity = parallel.particles.velocity[0, 1]
+
+    np.testing.assert_allclose(moved, velocity)
@@ -0,0 +1,136 @@
+import copy
+import types
+
+import numpy as np
+import pytest
+
+from FluidSimCore import (Simulation, gridLayout, makeParticleSystem, makeParticles, particle, particleEmitter,
+                          particleSink, particleSystem)
+
+#Function to make a simulation a few steps in with the fields built for where the particles are now, and a particle
+#object for every particle of its particleSystem
+def simulationAndObjects():
+    np.random.seed(0)
+    sim = Simulation(300, 300, 400, backend="numpy", sampling="window")
+    sim.useRandom = True
+    sim.setMouse(150, 150, False)
+    sim.step(5)
+    sim.updateFields()
+
+    objects = []
+    for (x, y), r, color, velocity in zip(sim.particles.position, sim.particles.radius, sim.particles.color, sim.particles.velocity):
+        objects.append(particle(int(r), float(x), float(y), tuple(int(c) for c in color)))
+        objects[-1].velocity = [float(velocity[0]), float(velocity[1])]
+
+    return sim, objects
+
+#Test that building the density field one particle object at a time gives the same field as the particleSystem
+def testDensityFromParticleObjectsMatches():
+    sim, objects = simulationAndObjects()
+    dField = copy.deepcopy(sim.dField)
+    dField.clearField()
+    for p in objects:
+        dField.updateField(p)
+    dField.normalizeField()
+
+    np.testing.assert_allclose(dField.field, sim.dField.field, rtol=0, atol=1e-12)
+
+#Test that the particleSystem moves every particle the same as the particle objects do one at a time from the same
+#fields and seed, with gravity, the random forces, the deceleration and the mouse
+def testParticleSystemMatchesParticleObjects():
+    sim, objects = simulationAndObjects()
+
+    state = np.random.get_state()
+    for p in objects:
+        p.updateVelocity(sim.g, sim.dampingcoeff, sim.timeStep, sim, True, True, True, sim.densityVal, sim.vField, sim.dField)
+        p.updatePosition(sim)
+        p.updateColor()
+    np.random.set_state(state)
+    sim.particles.updateVelocity(sim.g, sim.dampingcoeff, sim.timeStep, sim, True, True, True, sim.densityVal, sim.vField, sim.dField)
+    sim.particles.updatePosition(sim)
+    sim.particles.updateColor()
+
+    np.testing.assert_allclose([(p.posx, p.posy) for p in objects], sim.particles.position, rtol=0, atol=1e-9)
+    np.testing.assert_allclose([p.velocity for p in objects], sim.particles.velocity, rtol=0, atol=1e-9)
+    np.testing.assert_array_equal([p.color for p in objects], sim.particles.color)
+
+#Test that drawing all of the particles with sprites draws the same pixels as drawing each particle object
+def testDrawMatchesParticleObjects():
+    pygame = pytest.importorskip("pygame")
+    from FluidSim_SabaterAlvoGomez import offscreenWindow
+
+    sim, objects = simulationAndObjects()
+    eachBackground, objectBackground, background = offscreenWindow(300, 300), offscreenWindow(300, 300), offscreenWindow(300, 300)
+    sim.particles.drawEach(eachBackground)
+    for p in objects:
+        p.draw(objectBackground)
+    sim.particles.draw(background)
+
+    expected = pygame.surfarray.array3d(objectBackground.screen)
+    np.testing.assert_array_equal(pygame.surfarray.array3d(eachBackground.screen), expected)
+    np.testing.assert_array_equal(pygame.surfarray.array3d(background.screen), expected)
+
+#Test that the random kicks of all the substeps of a time step add up to the same spread of velocities as one kick
+#of the whole time step, whatever the number of substeps
+@pytest.mark.parametrize("substeps", [1, 4, 16])
+def testRandomKickVarianceIgnoresSubsteps(substeps):
+    np.random.seed(0)
+    timeStep = 0.01
+    particles = particleSystem(4, np.zeros((200000, 2)), (0, 163, 108))
+    for substep in range(substeps):
+        particles.updateVelocityRandom(timeStep / substeps, 1 / substeps)
+
+    np.testing.assert_allclose(particles.velocity.std(axis=0), 3*timeStep, rtol=0.01)
+
+#Test that the particle objects and the particleSystem start in the same block of the grid layout
+def testParticleObjectsStartOnGridLayout():
+    scene = types.SimpleNamespace(width=300, height=120)
+    objects = makeParticles(300, 4, (0, 163, 108), scene)
+
+    np.testing.assert_array_equal([(p.posx, p.posy) for p in objects], gridLayout(300, 4, scene))
+    np.testing.assert_array_equal(makeParticleSystem(300, 4, (0, 163, 108), scene).position, gridLayout(300, 4, scene))
+
+#Test that spawning past the capacity of the pool grows it without changing the particles that were there, and that
+#the new particles get their positions, velocities, color and radius
+def testSpawnGrowsPool():
+    particles = particleSystem(4, [[10, 10], [20, 20]], (0, 163, 108))
+    particles.velocity = [[1, 2], [3, 4]]
+    particles.spawn([[30, 30], [40, 40], [50, 50]], [[5, 6], [7, 8], [9, 10]], (255, 0, 0), 2)
+
+    assert len(particles) == 5
+    assert particles.capacity() == 8
+    np.testing.assert_array_equal(particles.position, [[10, 10], [20, 20], [30, 30], [40, 40], [50, 50]])
+    np.testing.assert_array_equal(particles.velocity, [[1, 2], [3, 4], [5, 6], [7, 8], [9, 10]])
+    np.testing.assert_array_equal(particles.color, [[0, 163, 108]]*2 + [[255, 0, 0]]*3)
+    np.testing.assert_array_equal(particles.radius, [4, 4, 2, 2, 2])
+
+    particles.reserve(6)
+    assert particles.capacity() == 8
+
+#Test that removing particles keeps the others in order at the start of the pool, without growing or shrinking it
+def testRemoveParticlesKeepsOrder():
+    particles = particleSystem(4, np.arange(5).repeat(2).reshape(5, 2), (0, 163, 108), capacity=8)
+    particles.velocity = np.arange(10).reshape(5, 2)
+
+    assert particles.removeParticles([False, True, False, True, False]) == 2
+    assert particles.removeParticles([False, False, False]) == 0
+    assert len(particles) == 3
+    assert particles.capacity() == 8
+    np.testing.assert_array_equal(particles.position, [[0, 0], [2, 2], [4, 4]])
+    np.testing.assert_array_equal(particles.velocity, [[0, 1], [4, 5], [8, 9]])
+
+#Test that an emitter adds its particles on every few steps in its box, and that a sink removes every particle that
+#ends a step inside of it
+def testEmittersAndSinks():
+    np.random.seed(0)
+    sim = Simulation(300, 300, 100, backend="numpy")
+    emitter = particleEmitter(20, 20, 5, width=20, height=20, every=2)
+    sim.emitters.append(emitter)
+    sim.step(4)
+    assert len(sim.particles) == 110
+
+    sink = particleSink(0, 0, 80, 80)
+    sim.sinks.append(sink)
+    sim.step()
+    assert len(sim.particles) < 115
+    assert not sink.contains(sim.particles.position).any()
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from FluidSimCore import Simulation, particleEmitter
+from FluidSimRecorder import trajectoryRecorder, trajectoryReader
+
+#Test that pouring in more particles than the recording has room for stops the recording with a warning instead of
+#stopping the simulation, keeping the frames recorded until then
+def testRecordingStopsWhenParticlesOutgrowIt(tmp_path):
+    np.random.seed(0)
+    sim = Simulation(200, 200, 50, backend="numpy")
+    sim.emitters.append(particleEmitter(80, 10, 10, width=40, height=10))
+    recorder = trajectoryRecorder(str(tmp_path / "run.rec"), sim, 50, maxParticles=100)
+
+    recorded = []
+    with pytest.warns(UserWarning, match="recording stopped"):
+        for i in range(10):
+            sim.step()
+            recorded.append(recorder.record(sim))
+    recorder.close()
+
+    assert recorded == [True]*5 + [False]*5
+    assert len(trajectoryReader(str(tmp_path / "run.rec"))) == 5
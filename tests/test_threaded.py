@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+import pytest
+
+import FluidSimJit
+from FluidSimCore import Simulation, frameScheduler
+from FluidSimThreaded import frameState, threadedSimulation
+
+#Test that a frameState keeps the memory the fields of the simulation used when it was copied, so the main thread
+#never has to read the buffers of the simulation while the worker thread steps it
+def testFrameStateKeepsFieldMemory():
+    sim = Simulation(200, 200, 300, backend="numpy", tileSize=16)
+    sim.step()
+    state = frameState(sim)
+    state.copyFrom(sim)
+
+    assert state.fieldMemory() == sim.fieldMemory() > 0
+
+#Test that stepping on the worker thread, with the mouse sent through the commands before the first step, ends up
+#exactly where stepping the same simulation serially for the same number of steps does, and that the front
+#frameState holds the last step
+@pytest.mark.parametrize("backend", ["numpy", "numba"])
+def testThreadedMatchesSerial(backend):
+    if backend == "numba" and not FluidSimJit.available:
+        pytest.skip("numba is not installed")
+
+    np.random.seed(0)
+    sim = Simulation(200, 200, 200, backend=backend)
+    sim.useRandom = True
+    threaded = threadedSimulation(sim, frameScheduler(100))
+    threaded.send(sim.setMouse, 100, 100, False)
+    threaded.setRunning(True)
+    while sim.stepCount < 5:
+        time.sleep(0.01)
+    threaded.setRunning(False)
+    threaded.close()
+    steps = sim.stepCount
+
+    np.random.seed(0)
+    serial = Simulation(200, 200, 200, backend=backend)
+    serial.useRandom = True
+    serial.setMouse(100, 100, False)
+    serial.step(steps)
+
+    expected, state = serial.snapshot(True), sim.snapshot(True)
+    for name in expected:
+        np.testing.assert_array_equal(state[name], expected[name])
+
+    view = threaded.acquire()
+    assert view.step == steps
+    np.testing.assert_array_equal(view.particles.position, expected["position"])
+    np.testing.assert_array_equal(view.dField.field, expected["density"])
+    np.testing.assert_array_equal(view.vField.field, expected["vectors"])
+    threaded.release()
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from FluidSimCore import Simulation
+
+#Function to run a seeded Simulation for a number of steps, with or without tiles
+def tiledRun(tileSize, sampling, steps=60):
+    np.random.seed(3)
+    sim = Simulation(300, 300, 800, backend="numpy", cellSize=3, tileSize=tileSize, sampling=sampling)
+    for _ in range(steps):
+        sim.step()
+    return sim
+
+#Test that splitting the fields into tiles moves the particles exactly like building the whole fields, whichever
+#sampling method "auto" picks
+@pytest.mark.parametrize("sampling", ["auto", "window", "table"])
+def testTiledMatchesDense(sampling):
+    dense, tiled = tiledRun(None, sampling), tiledRun(7, sampling)
+
+    assert tiled.dField.boxSampling(800) == dense.dField.boxSampling(800)
+    assert tiled.vField.sumSampling(800) == dense.vField.sumSampling(800)
+    np.testing.assert_array_equal(tiled.particles.position, dense.particles.position)
+    np.testing.assert_array_equal(tiled.particles.velocity, dense.particles.velocity)
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from FluidSimCore import vectorField
+
+#Test that the fast mode, keeping its dirrections as bytes, builds the same vectors as sorting the shifted densities,
+#for the float types the fields can be stored as
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def testFastVectorsMatchArgsort(dtype):
+    density = np.random.default_rng(0).random((60, 80)).astype(dtype)
+    expected = vectorField(80, 60, 4, mode="argsort", dtype=dtype)
+    expected.updateVectorField(density)
+    fast = vectorField(80, 60, 4, mode="fast", dtype=dtype)
+    fast.updateVectorField(density)
+
+    assert fast.direction.dtype == np.uint8
+    np.testing.assert_array_equal(fast.field, expected.field)
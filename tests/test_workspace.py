@@ -0,0 +1,58 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from FluidSimCore import Simulation
+
+#Function to get the most memory, in MB, allocated at once while running phase on top of what was allocated before
+def phasePeak(phase):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    phase()
+    return (tracemalloc.get_traced_memory()[1] - before) / 2**20
+
+#Test that once the buffers of the frameWorkspaces are made, building the fields, moving the particles and drawing
+#them only allocates small arrays for the particles, never anything the size of the fields (a field of the 500x500
+#scene is 1.9 MB), whether the particles sample the fields with windows or with tables
+@pytest.mark.parametrize("tileSize", [None, 32])
+@pytest.mark.parametrize("sampling", ["window", "table"])
+def testFramePhasesReuseBuffers(tileSize, sampling):
+    pygame = pytest.importorskip("pygame")
+    from FluidSim_SabaterAlvoGomez import offscreenWindow
+
+    np.random.seed(0)
+    sim = Simulation(500, 500, 500, backend="numpy", tileSize=tileSize, sampling=sampling)
+    background = offscreenWindow(500, 500)
+
+    def draw():
+        background.clear()
+        sim.dField.drawDensityField(background)
+        sim.vField.drawVectorField(background)
+        sim.particles.draw(background)
+
+    #Warming up so every buffer is made
+    for i in range(3):
+        sim.step()
+        draw()
+
+    tracemalloc.start()
+    try:
+        peaks = {"density": phasePeak(sim.updateDensity), "vectors": phasePeak(sim.updateVectors),
+                 "particles": phasePeak(sim.updateParticles), "draw": phasePeak(draw)}
+    finally:
+        tracemalloc.stop()
+
+    assert peaks["density"] < 0.5, peaks
+    assert peaks["vectors"] < 0.5, peaks
+    assert peaks["draw"] < 0.5, peaks
+    #Summing the windows gathers up to 2**16 values of a field at once for the particles whatever the number of
+    #particles, which is still less than a field
+    assert peaks["particles"] < sim.dField.field.nbytes / 2**20, peaks
+
+#Test that the sph solver, which never builds the fields, takes up the same memory for them on any size of scene
+def testSphFieldMemoryIgnoresSceneSize():
+    small = Simulation(500, 500, 500, solver="sph", backend="numpy")
+    large = Simulation(4000, 4000, 500, solver="sph", backend="numpy")
+
+    assert large.fieldMemory() == small.fieldMemory() < 2**20